@@ -7,9 +7,23 @@ from datetime import datetime
 from dateutil.relativedelta import relativedelta
 from supabase import create_client, Client
 import hashlib
+import io
+import json
+import logging
+import threading
+import time
+import urllib.request
+from collections import OrderedDict
 from dotenv import load_dotenv
+from conciliacao import conciliar, conciliar_um_para_um
+from formatacao import centavos, datas_texto, money, money_serie, normaliza_tipos, rotulos_contas
+from importacao import (
+    MOTIVO_DATA_INVALIDA, MOTIVO_VALOR_INVALIDO, MOTIVO_VAZIO,
+    datas, le_csv_blocos, le_planilha_blocos, valores_centavos,
+)
 
 load_dotenv()
+logger = logging.getLogger(__name__)
 st.set_page_config(page_title="Contas a Pagar", page_icon="💸", layout="wide")
 
 # Sistema de Autenticação
@@ -210,13 +224,420 @@ def to_float(x):
     except: 
         return 0.0
 
-def fetch_table(table, select="*", order=None, eq=None):
+# Cache de leituras (compartilhado pelo processo) com TTL por tabela e invalidação na escrita
+CACHE_TTL_PADRAO = 60  # segundos
+CACHE_TTL = {
+    "contas": 30,
+    "pagamentos": 30,
+    "aprovacoes": 30,
+    "extrato": 30,
+    "fornecedores": 300,
+    "categorias": 300,
+    "cadastro_contas": 300,
+}
+
+def _cache_ttl(table):
+    """TTL da tabela: variável CACHE_TTL_<TABELA> → CACHE_TTL → padrão."""
+    valor = env_get(f"CACHE_TTL_{table.upper()}")
     try:
-        q = sb.table(table).select(select)
-        if eq:
-            for k,v in eq.items(): q = q.eq(k, v)
-        if order: q = q.order(order, desc=True)
-        return pd.DataFrame(q.execute().data or [])
+        return float(valor) if valor is not None else CACHE_TTL.get(table, CACHE_TTL_PADRAO)
+    except ValueError:
+        return CACHE_TTL.get(table, CACHE_TTL_PADRAO)
+
+# Teto de memória do cache compartilhado (consultas e réplicas); acima dele as menos usadas saem (LRU)
+CACHE_MAX_MB = float(env_get("CACHE_MAX_MB") or 256)
+
+@st.cache_resource
+def _cache_store():
+    """Cache único do processo, lido por todas as sessões (somente leitura).
+
+    "entradas": {chave: (carregado_em, versão, valor, bytes)} em ordem de uso,
+    incluindo as réplicas (chave (tabela, "replica", select));
+    "versoes": {tabela: n}, incrementada a cada escrita — um snapshot só é
+    servido enquanto a versão da tabela for a mesma com que foi lido.
+    """
+    return {"lock": threading.Lock(), "entradas": OrderedDict(), "versoes": {}, "bytes": 0}
+
+def _tamanho(valor):
+    df = valor[0] if isinstance(valor, tuple) else valor["df"] if isinstance(valor, dict) else valor
+    return int(df.memory_usage(deep=True).sum()) if isinstance(df, pd.DataFrame) else 0
+
+def _despeja(store):
+    """Despeja as entradas usadas há mais tempo até caber no teto (chamar com o lock)."""
+    while store["bytes"] > CACHE_MAX_MB * 1024 * 1024 and len(store["entradas"]) > 1:
+        _, velho = store["entradas"].popitem(last=False)
+        store["bytes"] -= velho[3]
+
+def versao_tabela(table):
+    """Versão atual da tabela no cache compartilhado (capturar antes de consultar)."""
+    return _cache_store()["versoes"].get(table, 0)
+
+def cache_residente():
+    """Bytes residentes no cache compartilhado (consultas e réplicas), por tabela: {tabela: bytes}."""
+    store = _cache_store()
+    residente = {}
+    with store["lock"]:
+        for key, (_, _, _, n) in store["entradas"].items():
+            residente[key[0]] = residente.get(key[0], 0) + n
+    return residente
+
+def cache_stats():
+    """Contadores do cache por tabela: {tabela: {"hits", "misses", "memo"}}."""
+    return st.session_state.setdefault("_cache_stats", {})
+
+def inicia_execucao(pagina):
+    """Zera o memo da execução atual do script (chamado uma vez por rerun)."""
+    st.session_state["_memo_execucao"] = {"pagina": pagina, "consultas": {}, "valores": {}}
+    aplica_invalidacoes_importacao()
+
+def _memo_execucao():
+    return st.session_state.setdefault("_memo_execucao", {"pagina": None, "consultas": {}, "valores": {}})
+
+def consultas_repetidas():
+    """Consultas feitas mais de uma vez na execução atual: {chave: vezes}."""
+    return {k: n for k, n in _memo_execucao()["consultas"].items() if n > 1}
+
+def _cache_get(table, key, cache=True):
+    """Retorna o valor do memo da execução ou do cache se ainda válido (contabilizando)."""
+    stats = cache_stats().setdefault(table, {"hits": 0, "misses": 0, "memo": 0})
+    memo = _memo_execucao()
+    memo["consultas"][key] = memo["consultas"].get(key, 0) + 1
+    if cache and key in memo["valores"]:
+        # Mesma consulta já feita nesta execução: nunca vai ao banco de novo
+        stats["memo"] += 1
+        return memo["valores"][key]
+    if cache:
+        store = _cache_store()
+        with store["lock"]:
+            hit = store["entradas"].get(key)
+            if hit is not None and hit[1] == store["versoes"].get(table, 0) and time.monotonic() - hit[0] <= _cache_ttl(table):
+                store["entradas"].move_to_end(key)
+                stats["hits"] += 1
+                memo["valores"][key] = hit[2]
+                return hit[2]
+    stats["misses"] += 1
+    return None
+
+def _cache_put(key, value, versao):
+    """Guarda o snapshot lido sob `versao`; se a tabela mudou no meio da leitura, não entra no cache."""
+    _memo_execucao()["valores"][key] = value
+    store = _cache_store()
+    n = _tamanho(value)
+    with store["lock"]:
+        if versao != store["versoes"].get(key[0], 0):
+            return
+        antigo = store["entradas"].pop(key, None)
+        if antigo is not None:
+            store["bytes"] -= antigo[3]
+        store["entradas"][key] = (time.monotonic(), versao, value, n)
+        store["bytes"] += n
+        _despeja(store)
+
+def invalidate_tables(*tables):
+    """Descarta do cache todas as consultas das tabelas informadas."""
+    # Consultas que embutem alguma das tabelas (RELACOES) também ficam obsoletas
+    afetadas = set(tables) | {
+        t for t, rels in RELACOES.items() for rel in rels.values() if rel.split("(", 1)[0] in tables
+    }
+    store = _cache_store()
+    with store["lock"]:
+        for t in afetadas:
+            store["versoes"][t] = store["versoes"].get(t, 0) + 1
+        # Réplicas da própria tabela seguem por delta; as que embutem a tabela alterada recarregam
+        for key in [k for k in store["entradas"] if k[0] in afetadas and not (k[1] == "replica" and k[0] in tables)]:
+            store["bytes"] -= store["entradas"].pop(key)[3]
+    valores = _memo_execucao()["valores"]
+    for key in [k for k in valores if k[0] in afetadas]:
+        del valores[key]
+    if "cadastro_contas" in afetadas:
+        _catalogo_lancamento.clear()
+    if "contas" in afetadas:
+        _empresas_contas.clear()
+
+# Catálogo do formulário de lançamento: opções derivadas do cadastro de contas
+CAMPOS_CATALOGO = ["empresa", "razao_social", "categoria_titulo", "centro_custo", "classificacao_gastos", "area", "cidade", "uf"]
+
+@st.cache_data(ttl=_cache_ttl("cadastro_contas"), show_spinner=False)
+def _catalogo_lancamento():
+    """Monta todas as listas de opções e o mapa razão social → CNPJ numa só passada.
+
+    Compartilhado entre sessões; `invalidate_tables("cadastro_contas")` o descarta.
+    """
+    df = pd.DataFrame(sb.table("cadastro_contas").select("*").execute().data or [])
+    opcoes = {c: [] for c in CAMPOS_CATALOGO}
+    razao_to_cnpj = {}
+    if df.empty:
+        return {"opcoes": opcoes, "razao_to_cnpj": razao_to_cnpj}
+    if "criado_em" in df.columns:
+        df = df.sort_values("criado_em", kind="stable")
+    presentes = [c for c in CAMPOS_CATALOGO if c in df.columns]
+    # Formato longo (campo, valor): limpeza, unicidade e ordenação de todos os campos de uma vez
+    longo = df[presentes].melt(var_name="campo", value_name="valor").dropna()
+    longo["valor"] = longo["valor"].map(str).str.strip()
+    longo = longo[longo["valor"] != ""].drop_duplicates().sort_values(["campo", "valor"])
+    opcoes.update(longo.groupby("campo", sort=False)["valor"].agg(list).to_dict())
+    # Primeira ocorrência (por criado_em) de CNPJ para cada razão social
+    if {"razao_social", "cnpj"} <= set(df.columns):
+        pares = df[["razao_social", "cnpj"]].dropna()
+        pares = pd.DataFrame({"razao_social": pares["razao_social"].map(str).str.strip(), "cnpj": pares["cnpj"].map(str)})
+        pares = pares[(pares["razao_social"] != "") & (pares["cnpj"].str.strip() != "")]
+        razao_to_cnpj = pares.drop_duplicates("razao_social").set_index("razao_social")["cnpj"].to_dict()
+    return {"opcoes": opcoes, "razao_to_cnpj": razao_to_cnpj}
+
+def catalogo_lancamento():
+    """Catálogo do formulário de lançamento: {"opcoes": {campo: [valores]}, "razao_to_cnpj": {...}}."""
+    try:
+        return _catalogo_lancamento()
+    except Exception as e:
+        msg = "⚠️ Erro de conexão com o banco de dados."
+        if _str_to_bool(env_get('DEBUG')):
+            st.warning(f"{msg} Detalhes: {str(e)[:300]}...")
+        else:
+            st.warning(msg)
+        return {"opcoes": {c: [] for c in CAMPOS_CATALOGO}, "razao_to_cnpj": {}}
+
+@st.cache_data(ttl=_cache_ttl("cadastro_contas"), show_spinner=False)
+def _empresas_contas():
+    """Empresas distintas já usadas em contas, via RPC `empresas_contas` (ver schema.sql)."""
+    res = sb.rpc("empresas_contas", {}).execute()
+    return [r["empresas_contas"] if isinstance(r, dict) else r for r in res.data or []]
+
+def empresas_grade(empresas_cadastro):
+    """Empresas do filtro da grade: as do cadastro e as já usadas em contas (importadas ou de cadastros removidos).
+
+    Sem a função no banco (ou com erro), fica só com a lista do cadastro.
+    """
+    try:
+        usadas = _empresas_contas()
+    except Exception as e:
+        if _str_to_bool(env_get('DEBUG')):
+            st.warning(f"Empresas usadas em contas indisponíveis; mostrando só as do cadastro. Detalhes: {str(e)[:300]}...")
+        usadas = []
+    return sorted(set(empresas_cadastro) | {str(e) for e in usadas if e and str(e).strip()})
+
+def _apply_filters(q, filters):
+    """Aplica filtros PostgREST no formato (operador, coluna, valor), ex. ("gte", "vencimento", "2024-01-01").
+
+    Para "or_" a coluna é ignorada e o valor é a expressão, ex. ("or_", None, "id.eq.1,id.eq.2").
+    """
+    for op, col, val in filters or []:
+        q = q.or_(val) if op == "or_" else getattr(q, op)(col, val)
+    return q
+
+def _filters_key(filters):
+    return tuple((op, col, tuple(val) if isinstance(val, (list, tuple)) else str(val)) for op, col, val in filters or [])
+
+# Relacionamentos declarados para embutir via PostgREST: tabela -> {apelido: "relacionada(colunas)"}.
+# Cada coluna embutida vira `<apelido>_<coluna>` no frame (ex. fornecedor_nome).
+RELACOES = {
+    "contas": {
+        "fornecedor": "fornecedores(nome)",
+        "categoria": "categorias(nome)",
+    },
+}
+
+def _select_with_embed(table, select, embed):
+    if not embed:
+        return select
+    return ",".join([select] + [f"{alias}:{RELACOES[table][alias]}" for alias in embed])
+
+def _colunas_embed(table, embed):
+    """Nomes das colunas achatadas (`<apelido>_<coluna>`) dos apelidos em `embed`."""
+    return [
+        f"{alias}_{col.strip()}"
+        for alias in embed or ()
+        for col in RELACOES[table][alias].split("(", 1)[1].rstrip(")").split(",")
+    ]
+
+def _projeta(df, table, select, embed):
+    """Recorta de um frame mais largo as colunas de `select` + `embed` (None se faltar alguma)."""
+    todos = tuple(RELACOES.get(table, {}))
+    if select == "*":
+        fora = set(_colunas_embed(table, [a for a in todos if a not in (embed or ())]))
+        return df[[c for c in df.columns if c not in fora]]
+    colunas = [c.strip() for c in select.split(",")] + _colunas_embed(table, embed)
+    if not set(colunas) <= set(df.columns):
+        return None
+    return df[colunas]
+
+def projecao(table, colunas):
+    """Select só com as colunas declaradas que existem na tabela ("*" se o schema é desconhecido)."""
+    existentes = colunas_tabela(table)
+    if not existentes:
+        return "*"
+    return ",".join(c for c in colunas if c in existentes) or "*"
+
+def _flatten_embed(df, table, embed):
+    """Achata os objetos embutidos em colunas `<apelido>_<coluna>`."""
+    for alias in embed or ():
+        cols = RELACOES[table][alias].split("(", 1)[1].rstrip(")").split(",")
+        objs = df.pop(alias) if alias in df.columns else pd.Series([None] * len(df), index=df.index, dtype=object)
+        for col in cols:
+            df[f"{alias}_{col.strip()}"] = objs.map(lambda d: d.get(col.strip()) if isinstance(d, dict) else None)
+    return df
+
+# Réplicas locais (compartilhadas pelo processo) sincronizadas por delta: após a carga
+# inicial, só vêm linhas com id novo ou atualizado_em recente, e as exclusões
+# registradas em public.exclusoes (ver schema.sql) são removidas da réplica. Ficam no
+# cache compartilhado e contam no CACHE_MAX_MB: despejada, a réplica recarrega por inteiro.
+REPLICAS = {"contas", "pagamentos", "aprovacoes"}
+# Folga ao reler alterações: cobre transações que gravaram com carimbo anterior ao último visto
+DELTA_MARGEM = pd.Timedelta(seconds=5)
+
+def replicas_residentes():
+    """Réplicas no cache compartilhado: {(tabela, "replica", select): {"df", "max_exclusao", "sincronizado_em", "versao", "linhas"}}."""
+    store = _cache_store()
+    with store["lock"]:
+        return {k: v[2] for k, v in store["entradas"].items() if k[1] == "replica"}
+
+def _desde(carimbo):
+    return (pd.Timestamp(carimbo) - DELTA_MARGEM).isoformat()
+
+def _ultima_exclusao(table):
+    res = sb.table("exclusoes").select("excluido_em").eq("tabela", table).order("excluido_em", desc=True).limit(1).execute()
+    return res.data[0]["excluido_em"] if res.data else None
+
+def _carrega_replica(table, select, embed):
+    """Carga completa: marca a última exclusão antes de ler, para não perder nenhuma."""
+    try:
+        max_exclusao = _ultima_exclusao(table)
+    except Exception as e:
+        logger.debug("Sem registro de exclusões para %s: %s", table, e)
+        max_exclusao = None
+    df = normaliza_tipos(_flatten_embed(pd.DataFrame(sb.table(table).select(select).execute().data or []), table, embed), table)
+    return {"df": df, "max_exclusao": max_exclusao, "linhas": len(df)}
+
+def _aplica_delta(rep, table, select, embed):
+    """Busca só o que mudou desde a última sincronização; devolve uma nova réplica (não altera `rep`)."""
+    rep = dict(rep)
+    df = rep["df"]
+    max_id = int(df["id"].max()) if not df.empty else 0
+    q = sb.table(table).select(select)
+    if "atualizado_em" in df.columns and df["atualizado_em"].notna().any():
+        q = q.or_(f'id.gt.{max_id},atualizado_em.gte."{_desde(df["atualizado_em"].dropna().max())}"')
+    else:
+        q = q.gt("id", max_id)
+    delta = normaliza_tipos(_flatten_embed(pd.DataFrame(q.execute().data or []), table, embed), table)
+    q_exc = sb.table("exclusoes").select("registro_id,excluido_em").eq("tabela", table)
+    if rep["max_exclusao"] is not None:
+        q_exc = q_exc.gte("excluido_em", _desde(rep["max_exclusao"]))
+    tombstones = q_exc.execute().data or []
+    excluidos = [r["registro_id"] for r in tombstones]
+    if tombstones:
+        rep["max_exclusao"] = max(r["excluido_em"] for r in tombstones)
+    if not delta.empty or excluidos:
+        fora = df["id"].isin(excluidos)
+        if not delta.empty:
+            fora |= df["id"].isin(delta["id"])
+        df = pd.concat([df[~fora], delta], ignore_index=True) if not delta.empty else df[~fora]
+        df = normaliza_tipos(df, table).sort_values("id", kind="stable", ignore_index=True)
+    rep["df"] = df
+    rep["linhas"] = len(delta) + len(excluidos)
+    return rep
+
+def fetch_replica(table):
+    """Tabela inteira (todas as colunas e relações) via réplica local: carga completa na primeira vez, depois apenas deltas."""
+    embed = tuple(RELACOES.get(table, {}))
+    select = _select_with_embed(table, "*", embed)
+    key = (table, "replica", select)
+    stats = cache_stats().setdefault(table, {"hits": 0, "misses": 0, "memo": 0})
+    memo = _memo_execucao()
+    memo["consultas"][key] = memo["consultas"].get(key, 0) + 1
+    if key in memo["valores"]:
+        stats["memo"] += 1
+        return memo["valores"][key]
+    store = _cache_store()
+    with store["lock"]:
+        entrada = store["entradas"].get(key)
+        rep = entrada[2] if entrada is not None else None
+        if entrada is not None:
+            store["entradas"].move_to_end(key)
+        versao = store["versoes"].get(table, 0)
+    if rep is not None and rep["versao"] == versao and time.monotonic() - rep["sincronizado_em"] <= _cache_ttl(table):
+        stats["hits"] += 1
+        df = rep["df"]
+    else:
+        stats["misses"] += 1
+        # Rede fora do lock: outras tabelas (e outras sessões) não esperam esta sincronização
+        try:
+            novo = _aplica_delta(rep, table, select, embed) if rep is not None else _carrega_replica(table, select, embed)
+        except Exception as e:
+            # Delta indisponível (ex.: schema sem atualizado_em/exclusoes): recarrega tudo
+            logger.debug("Delta de %s falhou, recarga completa: %s", table, e)
+            novo = _carrega_replica(table, select, embed)
+        novo["versao"] = versao
+        novo["sincronizado_em"] = time.monotonic()
+        n = _tamanho(novo)
+        with store["lock"]:
+            # Só grava se ninguém trocou/descartou a réplica nem invalidou a tabela durante a busca
+            atual = store["entradas"].get(key)
+            if (atual[2] if atual is not None else None) is rep and store["versoes"].get(table, 0) == versao:
+                if atual is not None:
+                    store["bytes"] -= atual[3]
+                store["entradas"][key] = (novo["sincronizado_em"], versao, novo, n)
+                store["entradas"].move_to_end(key)
+                store["bytes"] += n
+                _despeja(store)
+        df = novo["df"]
+    memo["valores"][key] = df
+    return df
+
+def _projecao_em_cache(table, key, select, embed):
+    """Serve a consulta a partir de outra já em cache com os mesmos filtros e mais colunas."""
+    if select == "*":
+        return None
+    store = _cache_store()
+    with store["lock"]:
+        versao = store["versoes"].get(table, 0)
+        candidatos = [
+            v for k, v in store["entradas"].items()
+            if k[:2] == key[:2] and k[3:] == key[3:] and v[1] == versao and time.monotonic() - v[0] <= _cache_ttl(table)
+        ]
+    for _, _, valor, _ in candidatos:
+        df = _projeta(valor, table, select, embed)
+        if df is not None:
+            cache_stats()[table]["hits"] += 1
+            cache_stats()[table]["misses"] -= 1
+            return df
+    return None
+
+def fetch_table(table, select="*", order=None, eq=None, limit=None, desc=True, embed=None, cache=True):
+    """Lê uma tabela (com cache). `embed` lista apelidos de RELACOES a trazer no mesmo request."""
+    if cache and table in REPLICAS and not eq and not limit:
+        # Uma réplica larga por tabela; cada página recebe só a projeção que pediu
+        try:
+            df = _projeta(fetch_replica(table), table, select, embed)
+        except Exception as e:
+            msg = "⚠️ Erro de conexão com o banco de dados."
+            if _str_to_bool(env_get('DEBUG')):
+                st.warning(f"{msg} Detalhes: {str(e)[:300]}...")
+            else:
+                st.warning(msg)
+            return pd.DataFrame()
+        if df is not None:
+            if order and order in df.columns:
+                return df.sort_values(order, ascending=not desc, kind="stable", ignore_index=True)
+            return df.copy()
+    filters = [("eq", k, v) for k, v in sorted((eq or {}).items())]
+    colunas = select  # antes do embed: é o que `_projeta` recorta de um frame em cache
+    select = _select_with_embed(table, select, embed)
+    key = (table, "table", select, order, desc, limit, _filters_key(filters))
+    hit = _cache_get(table, key, cache)
+    if hit is None and cache:
+        hit = _projecao_em_cache(table, key, colunas, embed)
+    if hit is not None:
+        # Cópia: as páginas acrescentam/alteram colunas no frame recebido
+        return hit.copy()
+    versao = versao_tabela(table)
+    try:
+        q = _apply_filters(sb.table(table).select(select), filters)
+        if order: q = q.order(order, desc=desc)
+        if limit: q = q.limit(limit)
+        df = normaliza_tipos(_flatten_embed(pd.DataFrame(q.execute().data or []), table, embed), table)
+        if cache:
+            _cache_put(key, df, versao)
+            return df.copy()
+        return df
     except Exception as e:
         msg = f"⚠️ Erro de conexão com o banco de dados."
         if _str_to_bool(env_get('DEBUG')):
@@ -225,21 +646,143 @@ def fetch_table(table, select="*", order=None, eq=None):
             st.warning(msg)
         return pd.DataFrame()
 
+def fetch_page(table, select="*", filters=None, order=("criado_em", "id"), limit=100, after=None, embed=None, cache=True):
+    """Busca uma página filtrada no servidor, ordenada de forma decrescente por `order`.
+
+    Paginação por chave (keyset): `after` recebe os valores de `order` da última
+    linha da página anterior. Retorna (DataFrame, total de linhas com os filtros).
+    """
+    select = _select_with_embed(table, select, embed)
+    key = (table, "page", select, order, limit, after, _filters_key(filters))
+    hit = _cache_get(table, key, cache)
+    if hit is not None:
+        return hit[0].copy(), hit[1]
+    versao = versao_tabela(table)
+    try:
+        q = _apply_filters(sb.table(table).select(select, count="exact"), filters)
+        c1, c2 = order
+        if after is not None:
+            v1, v2 = after
+            q = q.or_(f'{c1}.lt."{v1}",and({c1}.eq."{v1}",{c2}.lt.{v2})')
+        res = q.order(c1, desc=True).order(c2, desc=True).limit(limit).execute()
+        df = normaliza_tipos(_flatten_embed(pd.DataFrame(res.data or []), table, embed), table)
+        total = res.count if res.count is not None else len(df)
+        if cache:
+            _cache_put(key, (df, total), versao)
+            return df.copy(), total
+        return df, total
+    except Exception as e:
+        msg = "⚠️ Erro de conexão com o banco de dados."
+        if _str_to_bool(env_get('DEBUG')):
+            st.warning(f"{msg} Detalhes: {str(e)[:300]}...")
+        else:
+            st.warning(msg)
+        return pd.DataFrame(), 0
+
+# Registro de schema: colunas por tabela, carregadas uma vez por processo
+SCHEMA_TTL = int(env_get("SCHEMA_TTL") or 600)
+SCHEMA_FALHA_TTL = 30  # segundos até tentar de novo uma tabela cujas colunas não foram descobertas
+
+@st.cache_resource
+def _registro_schema():
+    """Registro compartilhado pelo processo: {tabela: (válido_até, [colunas])}."""
+    return {}
+
+def _colunas_openapi():
+    """Lê as colunas de todas as tabelas da descrição OpenAPI do PostgREST."""
+    url, key = env_get("SUPABASE_URL"), env_get("SUPABASE_ANON_KEY")
+    req = urllib.request.Request(
+        f"{url.rstrip('/')}/rest/v1/",
+        headers={"apikey": key, "Authorization": f"Bearer {key}", "Accept": "application/openapi+json"},
+    )
+    with urllib.request.urlopen(req, timeout=10) as resp:
+        spec = json.load(resp)
+    return {t: list((d.get("properties") or {}).keys()) for t, d in (spec.get("definitions") or {}).items()}
+
+def _colunas_sonda(table):
+    """Alternativa à OpenAPI: uma única linha basta para ler o cabeçalho."""
+    data = sb.table(table).select("*").limit(1).execute().data or []
+    return list(data[0].keys()) if data else None
+
+def colunas_tabela(table):
+    """Colunas de `table` segundo o registro de schema (lista vazia se desconhecidas)."""
+    registro = _registro_schema()
+    hit = registro.get(table)
+    agora = time.monotonic()
+    if hit is not None and agora <= hit[0]:
+        return hit[1]
+    try:
+        # Uma chamada à OpenAPI preenche o registro de todas as tabelas
+        descritas = _colunas_openapi()
+        for t, cols in descritas.items():
+            registro[t] = (agora + SCHEMA_TTL, cols)
+    except Exception as e:
+        logger.debug("OpenAPI indisponível para o registro de schema: %s", e)
+        descritas = {}
+    if table not in descritas:
+        try:
+            cols = _colunas_sonda(table)
+        except Exception:
+            cols = None
+        if cols is None:
+            # Sem como descobrir agora: mantém o último valor conhecido e só tenta de novo após SCHEMA_FALHA_TTL
+            registro[table] = (agora + SCHEMA_FALHA_TTL, hit[1] if hit is not None else [])
+        else:
+            registro[table] = (agora + SCHEMA_TTL, cols)
+    return registro[table][1]
+
+def invalida_schema(table=None):
+    """Descarta o schema registrado (de uma tabela ou de todas)."""
+    registro = _registro_schema()
+    if table is None:
+        registro.clear()
+    else:
+        registro.pop(table, None)
+
+def _erro_coluna_ausente(table, e):
+    """Se o erro indica coluna inexistente, força recarregar o schema da tabela."""
+    texto = str(e).lower()
+    if "pgrst204" in texto or ("column" in texto and ("does not exist" in texto or "schema cache" in texto)):
+        invalida_schema(table)
+
+def update_conta(conta_id, changes, expected=None):
+    """Atualiza apenas as colunas em `changes` (PATCH), sem ler a linha antes.
+
+    `expected` ativa a concorrência otimista: {coluna: valor lido} — ex.
+    {"atualizado_em": ...} — ou {coluna: [valores aceitos]}. Se a linha não
+    atende mais à condição, nada é gravado.
+
+    Retorna (resultado, conflito); resultado é None em caso de erro ou conflito.
+    """
+    try:
+        q = sb.table("contas").update(changes).eq("id", conta_id)
+        for k, v in (expected or {}).items():
+            q = q.in_(k, list(v)) if isinstance(v, (list, tuple, set)) else q.eq(k, v)
+        res = q.execute()
+        invalidate_tables("contas")
+        if expected and not res.data:
+            return None, True
+        return res, False
+    except Exception as e:
+        _erro_coluna_ausente("contas", e)
+        msg = "Erro ao salvar dados."
+        if _str_to_bool(env_get('DEBUG')):
+            st.error(f"{msg} Detalhes: {str(e)[:300]}...")
+        else:
+            st.error(msg)
+        return None, False
+
 def upsert(table, payload): 
+    # Para contas, envia só os campos fornecidos (não regrava colunas de outros usuários)
+    if table == "contas" and "id" in payload:
+        res, _ = update_conta(payload["id"], {k: v for k, v in payload.items() if k != "id"})
+        return res
     try:
-        # Para contas, só atualiza campos específicos sem sobrescrever campos obrigatórios
-        if table == "contas" and "id" in payload:
-            # Busca o registro atual primeiro
-            current = sb.table(table).select("*").eq("id", payload["id"]).execute()
-            if current.data:
-                # Mescla apenas os campos fornecidos com os existentes
-                existing = current.data[0]
-                for key, value in payload.items():
-                    if key != "id":  # Não sobrescreve o ID
-                        existing[key] = value
-                return sb.table(table).update(existing).eq("id", payload["id"]).execute()
-        return sb.table(table).upsert(payload).execute()
+        res = sb.table(table).upsert(payload).execute()
+        invalidate_tables(table)
+        return res
     except Exception as e:
+        _erro_coluna_ausente(table, e)
         msg = "Erro ao salvar dados."
         if _str_to_bool(env_get('DEBUG')):
             st.error(f"{msg} Detalhes: {str(e)[:300]}...")
@@ -249,8 +792,11 @@ def upsert(table, payload):
 
 def insert(table, payload): 
     try:
-        return sb.table(table).insert(payload).execute()
+        res = sb.table(table).insert(payload).execute()
+        invalidate_tables(table)
+        return res
     except Exception as e:
+        _erro_coluna_ausente(table, e)
         msg = "Erro ao inserir dados."
         if _str_to_bool(env_get('DEBUG')):
             st.error(f"{msg} Detalhes: {str(e)[:300]}...")
@@ -258,48 +804,775 @@ def insert(table, payload):
             st.error(msg)
         return None
 
-def delete_conta(conta_id):
-    """Exclui uma conta e todos os registros relacionados (aprovacoes, pagamentos)"""
+def aprovar_contas(ids, aprovado_por, data_aprovacao):
+    """Aprova várias contas numa única transação via RPC `aprovar_contas` (ver schema.sql).
+
+    Insere as aprovações e muda o status para 'aprovado' juntos; contas que já
+    não estão 'provisionado' são ignoradas. Retorna a lista de ids aprovados ou
+    None em caso de erro.
+    """
     try:
-        # Exclui pagamentos relacionados
-        sb.table("pagamentos").delete().eq("conta_id", conta_id).execute()
-        # Exclui aprovações relacionadas
-        sb.table("aprovacoes").delete().eq("conta_id", conta_id).execute()
-        # Exclui a conta
-        result = sb.table("contas").delete().eq("id", conta_id).execute()
-        return result
+        res = sb.rpc("aprovar_contas", {
+            "p_ids": [int(i) for i in ids],
+            "p_aprovado_por": aprovado_por,
+            "p_data_aprovacao": data_aprovacao,
+        }).execute()
+        invalidate_tables("contas", "aprovacoes")
+        return [int(r["aprovar_contas"]) if isinstance(r, dict) else int(r) for r in res.data or []]
     except Exception as e:
-        if _str_to_bool(env_get('DEBUG')):
-            st.exception(e)
+        err = str(e)
+        if "aprovar_contas" in err and ("PGRST202" in err or "does not exist" in err or "not find" in err):
+            st.error("Função 'aprovar_contas' não encontrada no banco. Execute o schema.sql atualizado no Supabase.")
+        elif _str_to_bool(env_get('DEBUG')):
+            st.error(f"Erro ao aprovar contas. Detalhes: {err[:300]}...")
         else:
-            st.error(f"Erro ao excluir conta: {str(e)[:200]}...")
+            st.error("Erro ao aprovar contas.")
+        return None
+
+def registrar_pagamentos(pagamentos):
+    """Paga várias contas numa única transação via RPC `registrar_pagamentos` (ver schema.sql).
+
+    Cada item traz conta_id, data_pagamento, valor_pago, forma_pagamento e,
+    opcionais, conciliado e atualizado_em (concorrência otimista). O status
+    vira 'pago' e o pagamento é inserido juntos; contas que já não estão em
+    aberto (ou mudaram desde `atualizado_em`) são ignoradas. Retorna a lista
+    de contas pagas ou None em caso de erro.
+    """
+    try:
+        res = sb.rpc("registrar_pagamentos", {"p_pagamentos": pagamentos}).execute()
+        invalidate_tables("contas", "pagamentos")
+        return [int(r["registrar_pagamentos"]) if isinstance(r, dict) else int(r) for r in res.data or []]
+    except Exception as e:
+        err = str(e)
+        if "registrar_pagamentos" in err and ("PGRST202" in err or "does not exist" in err or "not find" in err):
+            st.error("Função 'registrar_pagamentos' não encontrada no banco. Execute o schema.sql atualizado no Supabase.")
+        elif _str_to_bool(env_get('DEBUG')):
+            st.error(f"Erro ao registrar pagamentos. Detalhes: {err[:300]}...")
+        else:
+            st.error("Erro ao registrar pagamentos.")
+        return None
+
+DELETE_CHUNK_SIZE = 200
+
+def delete_contas(ids, chunk_size=DELETE_CHUNK_SIZE):
+    """Exclui contas em lote; aprovacoes e pagamentos saem via `on delete cascade`.
+
+    Um único delete com `in_` por lote de `chunk_size` ids. Retorna dict
+    id -> "excluída" | "não encontrada" | "erro: ...".
+    """
+    ids = list(dict.fromkeys(int(i) for i in ids))
+    resultado = {}
+    for lote in _chunks(ids, chunk_size):
+        try:
+            res = sb.table("contas").delete().in_("id", lote).execute()
+            excluidas = {int(r["id"]) for r in res.data or []}
+            for cid in lote:
+                resultado[cid] = "excluída" if cid in excluidas else "não encontrada"
+        except Exception as e:
+            if _str_to_bool(env_get('DEBUG')):
+                st.exception(e)
+            for cid in lote:
+                resultado[cid] = f"erro: {str(e)[:200]}"
+    invalidate_tables("contas", "pagamentos", "aprovacoes")
+    return resultado
+
+# Índice de resolução fornecedor/categoria (por sessão)
+RESOLUCAO_TTL = 300  # segundos
+
+def _norm_nome(nome):
+    """Normaliza nome para comparação: minúsculo e espaços colapsados."""
+    return " ".join(str(nome).split()).lower()
+
+def _norm_cnpj(cnpj):
+    """Mantém apenas os dígitos do CNPJ; None se não houver dígitos."""
+    if cnpj is None or (not isinstance(cnpj, str) and pd.isna(cnpj)):
         return None
+    digitos = "".join(ch for ch in str(cnpj) if ch.isdigit())
+    return digitos or None
+
+def _carrega_indice_resolucao():
+    forn = sb.table("fornecedores").select("id,nome,cnpj").execute().data or []
+    cats = sb.table("categorias").select("id,nome").execute().data or []
+    idx = {
+        "fornecedor_nome": {},
+        "fornecedor_cnpj": {},
+        "fornecedor_cnpj_atual": {},
+        "categoria_nome": {},
+        "carregado_em": time.monotonic(),
+    }
+    for row in forn:
+        _indexa_fornecedor(idx, row)
+    for row in cats:
+        idx["categoria_nome"].setdefault(_norm_nome(row["nome"]), int(row["id"]))
+    return idx
+
+def _indexa_fornecedor(idx, row):
+    fid = int(row["id"])
+    idx["fornecedor_nome"].setdefault(_norm_nome(row.get("nome", "")), fid)
+    cnpj = _norm_cnpj(row.get("cnpj"))
+    idx["fornecedor_cnpj_atual"][fid] = cnpj
+    if cnpj:
+        idx["fornecedor_cnpj"].setdefault(cnpj, fid)
+
+def indice_resolucao():
+    """Retorna o índice nome/CNPJ -> id da sessão, recarregando após RESOLUCAO_TTL.
+
+    Carregado uma vez por sessão e atualizado incrementalmente a cada insert,
+    de modo que as buscas não fazem I/O de rede.
+    """
+    idx = st.session_state.get("_indice_resolucao")
+    if idx is None or time.monotonic() - idx["carregado_em"] > RESOLUCAO_TTL:
+        idx = _carrega_indice_resolucao()
+        st.session_state["_indice_resolucao"] = idx
+    return idx
+
+def invalida_indice_resolucao():
+    st.session_state.pop("_indice_resolucao", None)
 
 def ensure_categoria(nome):
-    df = fetch_table("categorias", eq={"nome": nome})
-    if df.empty:
-        insert("categorias", {"nome": nome})
-        df = fetch_table("categorias", eq={"nome": nome})
-    return int(df.iloc[0]["id"])
+    idx = indice_resolucao()
+    cid = idx["categoria_nome"].get(_norm_nome(nome))
+    if cid is not None:
+        return cid
+    res = insert("categorias", {"nome": nome})
+    if res is None or not res.data:
+        # Pode ter sido criada por outro usuário: busca direta e recarrega o índice
+        invalida_indice_resolucao()
+        df = fetch_table("categorias", eq={"nome": nome}, cache=False)
+        return int(df.iloc[0]["id"]) if not df.empty else None
+    cid = int(res.data[0]["id"])
+    idx["categoria_nome"][_norm_nome(nome)] = cid
+    return cid
 
 def ensure_fornecedor(nome, cnpj=None, email=None, telefone=None):
-    df = fetch_table("fornecedores")
-    if not df.empty:
-        # Busca por nome ou CNPJ
-        hit = df[(df["nome"].str.lower() == nome.lower()) | (df["cnpj"] == cnpj)]
-        if not hit.empty: 
-            # Atualiza dados se CNPJ foi fornecido
-            if cnpj and hit.iloc[0]["cnpj"] != cnpj:
-                sb.table("fornecedores").update({"cnpj": cnpj, "email": email, "telefone": telefone}).eq("id", hit.iloc[0]["id"]).execute()
-            return int(hit.iloc[0]["id"])
-    insert("fornecedores", {"nome": nome, "cnpj": cnpj, "email": email, "telefone": telefone})
-    df2 = fetch_table("fornecedores")
-    hit2 = df2[df2["nome"].str.lower() == nome.lower()]
-    return int(hit2.iloc[0]["id"]) if not hit2.empty else None
-
-def money(x):
-    try: return f"R$ {float(x):,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
-    except: return x
+    idx = indice_resolucao()
+    cnpj_norm = _norm_cnpj(cnpj)
+    # Busca por nome ou CNPJ
+    fid = idx["fornecedor_nome"].get(_norm_nome(nome))
+    if fid is None and cnpj_norm:
+        fid = idx["fornecedor_cnpj"].get(cnpj_norm)
+    if fid is not None:
+        # Atualiza dados se CNPJ foi fornecido
+        if cnpj_norm and idx["fornecedor_cnpj_atual"].get(fid) != cnpj_norm:
+            sb.table("fornecedores").update({"cnpj": cnpj, "email": email, "telefone": telefone}).eq("id", fid).execute()
+            invalidate_tables("fornecedores")
+            idx["fornecedor_cnpj_atual"][fid] = cnpj_norm
+            idx["fornecedor_cnpj"].setdefault(cnpj_norm, fid)
+        return fid
+    res = insert("fornecedores", {"nome": nome, "cnpj": cnpj, "email": email, "telefone": telefone})
+    if res is None or not res.data:
+        invalida_indice_resolucao()
+        return None
+    _indexa_fornecedor(idx, res.data[0])
+    return int(res.data[0]["id"])
+
+# Importação em lote
+IMPORT_CHUNK_SIZE = 500
+
+def _chunks(seq, size):
+    """Divide uma lista em fatias de tamanho `size`."""
+    size = max(1, int(size))
+    for i in range(0, len(seq), size):
+        yield seq[i:i + size]
+
+def resolve_fornecedores_lote(pares, indice=None, invalida=None):
+    """Resolve em lote os ids de fornecedores a partir de pares (nome, cnpj).
+
+    Usa o índice de resolução da sessão (ou `indice`, fora do script) e cria os
+    ausentes com um único insert multi-linha. Retorna dict nome normalizado -> id.
+    """
+    idx = indice if indice is not None else indice_resolucao()
+    invalida = invalida or invalidate_tables
+    resolvidos, novos = {}, {}
+    for nome, cnpj in pares:
+        chave = _norm_nome(nome)
+        if chave in resolvidos or chave in novos:
+            continue
+        cnpj_norm = _norm_cnpj(cnpj)
+        fid = idx["fornecedor_nome"].get(chave)
+        if fid is None and cnpj_norm:
+            fid = idx["fornecedor_cnpj"].get(cnpj_norm)
+        if fid is None:
+            novos[chave] = {"nome": nome, "cnpj": cnpj}
+            continue
+        resolvidos[chave] = fid
+        # Atualiza CNPJ se foi fornecido e difere do cadastrado
+        if cnpj_norm and idx["fornecedor_cnpj_atual"].get(fid) != cnpj_norm:
+            sb.table("fornecedores").update({"cnpj": cnpj}).eq("id", fid).execute()
+            invalida("fornecedores")
+            idx["fornecedor_cnpj_atual"][fid] = cnpj_norm
+            idx["fornecedor_cnpj"].setdefault(cnpj_norm, fid)
+    for lote in _chunks(list(novos.values()), IMPORT_CHUNK_SIZE):
+        res = sb.table("fornecedores").insert(lote).execute()
+        invalida("fornecedores")
+        for row in res.data or []:
+            _indexa_fornecedor(idx, row)
+            resolvidos[_norm_nome(row["nome"])] = int(row["id"])
+    return resolvidos
+
+def resolve_categorias_lote(nomes, indice=None, invalida=None):
+    """Resolve em lote os ids de categorias; cria as ausentes com upsert multi-linha.
+
+    Nomes criados por outra sessão no meio do caminho (únicos em
+    categorias.nome) são ignorados pelo upsert e lidos em seguida.
+    Retorna dict nome normalizado -> id.
+    """
+    idx = indice if indice is not None else indice_resolucao()
+    invalida = invalida or invalidate_tables
+    resolvidos, faltantes = {}, {}
+    for nome in nomes:
+        if not nome:
+            continue
+        chave = _norm_nome(nome)
+        cid = idx["categoria_nome"].get(chave)
+        if cid is not None:
+            resolvidos[chave] = cid
+        else:
+            faltantes.setdefault(chave, {"nome": nome})
+    for lote in _chunks(list(faltantes.values()), IMPORT_CHUNK_SIZE):
+        res = sb.table("categorias").upsert(lote, on_conflict="nome", ignore_duplicates=True).execute()
+        invalida("categorias")
+        linhas = list(res.data or [])
+        criadas = {row["nome"] for row in linhas}
+        existentes = [r["nome"] for r in lote if r["nome"] not in criadas]
+        if existentes:
+            linhas += sb.table("categorias").select("id,nome").in_("nome", existentes).execute().data or []
+        for row in linhas:
+            chave = _norm_nome(row["nome"])
+            idx["categoria_nome"][chave] = int(row["id"])
+            resolvidos[chave] = int(row["id"])
+    return resolvidos
+
+def assinaturas_extrato(df):
+    """Assinatura estável de cada movimento: md5 de data|histórico|centavos|ordem.
+
+    A ordem é a posição da linha entre as idênticas (mesma data, histórico e
+    valor) do dia, para que dois lançamentos iguais no mesmo dia não se anulem.
+    Mesma fórmula do preenchimento retroativo em schema.sql.
+    """
+    datas = pd.to_datetime(df["data"]).dt.strftime("%Y-%m-%d")
+    historicos = df["historico"].map(str).str.strip()
+    cents = centavos(df["valor"]).astype("int64").map(str)
+    base = pd.DataFrame({"data": datas, "historico": historicos, "centavos": cents})
+    ordem = base.groupby(["data", "historico", "centavos"], sort=False).cumcount().map(str)
+    chave = datas + "|" + historicos + "|" + cents + "|" + ordem
+    return chave.map(lambda t: hashlib.md5(t.encode("utf-8")).hexdigest())
+
+def importar_extrato_lote(df, chunk_size=IMPORT_CHUNK_SIZE, on_lote=None, checkpoint=None, invalida=None):
+    """Grava movimentos (colunas data, historico, valor) em `extrato` de forma idempotente.
+
+    Cada linha leva sua assinatura; o índice único em extrato.assinatura faz o
+    banco ignorar as já gravadas (reenvio do mesmo arquivo não duplica nada).
+    Envia inserts multi-linha de `chunk_size`; `on_lote(parcial)` recebe o
+    resultado parcial após cada lote, com o `checkpoint` ({"lote": n,
+    "falhos": [lotes com erro]}) que permite retomar a partir do lote
+    seguinte, reenviando antes os lotes que falharam.
+
+    Retorna dict com `inseridas`, `ignoradas` (já existentes), `falhas`,
+    `feitas` (linhas enviadas), `segundos` e `checkpoint`.
+    """
+    inicio = time.perf_counter()
+    linhas = pd.DataFrame({
+        "data": pd.to_datetime(df["data"]).dt.strftime("%Y-%m-%d"),
+        "historico": df["historico"].map(str).str.strip(),
+        "valor": df["valor"].astype(float).round(2),
+        "assinatura": assinaturas_extrato(df),
+    }).drop_duplicates("assinatura").to_dict("records")
+    invalida = invalida or invalidate_tables
+    inseridas = ignoradas = feitas = 0
+    falhas = []
+    retomar = dict(checkpoint or {"lote": 0})
+    falhos = set(retomar.get("falhos", []))
+    checkpoint = {"lote": retomar["lote"], "falhos": sorted(falhos)}
+
+    def _parcial():
+        return {"inseridas": inseridas, "ignoradas": ignoradas, "falhas": falhas, "feitas": feitas,
+                "segundos": time.perf_counter() - inicio, "checkpoint": dict(checkpoint)}
+
+    for n_lote, lote in enumerate(_chunks(linhas, chunk_size), start=1):
+        reenvio = n_lote <= retomar["lote"]
+        if reenvio and n_lote not in falhos:
+            continue  # gravado antes da interrupção
+        try:
+            res = sb.table("extrato").upsert(lote, on_conflict="assinatura", ignore_duplicates=True).execute()
+            novas = len(res.data or [])
+            inseridas += novas
+            ignoradas += len(lote) - novas
+            falhos.discard(n_lote)
+        except Exception as e:
+            falhas.append({"lote": n_lote, "linhas": len(lote), "erro": str(e)[:300]})
+            falhos.add(n_lote)
+        if not reenvio:
+            feitas += len(lote)  # reenviados já foram contados na execução anterior
+            checkpoint["lote"] = n_lote
+        checkpoint["falhos"] = sorted(falhos)
+        if on_lote:
+            on_lote(_parcial())
+    if inseridas:
+        invalida("extrato")
+    return _parcial()
+
+def _objeto(serie):
+    # JSON não aceita NaN: ausentes viram None e inteiros seguem inteiros
+    return serie.astype(object).where(serie.notna(), None)
+
+def _valida_bloco_contas(df, col_mapping, primeira_linha):
+    """Valida e converte um bloco da planilha (sem laço por linha e sem ir ao banco).
+
+    `primeira_linha` é o número (1-based) da primeira linha do bloco no arquivo.
+    Retorna (validas, rejeitadas): `validas` traz as colunas já convertidas
+    das linhas aceitas, prontas para `_registros_contas`.
+    """
+    def _col(nome):
+        return df[col_mapping[nome]] if nome in col_mapping else pd.Series([None] * len(df), index=df.index)
+
+    numeros = pd.Series(range(primeira_linha, primeira_linha + len(df)), index=df.index)
+    vencimentos, motivo_venc = datas(_col("vencimento"))
+    cents, motivo_valor = valores_centavos(_col("valor_previsto"))
+    # Uma linha é rejeitada pelo primeiro problema encontrado: vencimento, depois valor
+    erro = motivo_venc.map({MOTIVO_VAZIO: "vencimento vazio", MOTIVO_DATA_INVALIDA: "vencimento inválido"}).fillna(
+        motivo_valor.map({MOTIVO_VAZIO: "valor vazio", MOTIVO_VALOR_INVALIDO: "valor inválido"})
+    )
+    rejeitadas = [{"linha": int(n), "erro": e} for n, e in zip(numeros[erro.notna()], erro.dropna())]
+    ok = erro.isna()
+
+    venc = vencimentos[ok]
+    validas = pd.DataFrame({
+        "fornecedor": _col("fornecedor")[ok].astype(str).str.strip(),
+        "categoria": _col("categoria")[ok].astype(str).str.strip(),
+        "cnpj": _col("cnpj")[ok].map(lambda v: str(v) if pd.notna(v) else None),
+        "descricao": _col("descricao")[ok].map(str),
+        "competencia": venc.dt.to_period("M").dt.start_time.dt.strftime("%Y-%m-%d"),
+        "vencimento": venc.dt.strftime("%Y-%m-%d"),
+        "valor_previsto": cents[ok].astype("float64") / 100,
+        "status": "provisionado",
+    })
+    # Campos opcionais entram em todas as linhas (insert multi-linha exige as mesmas chaves)
+    for opcional in ("empresa", "numero_documento"):
+        if opcional in col_mapping:
+            validas[opcional] = _objeto(_col(opcional)[ok].map(str, na_action="ignore"))
+    return validas, rejeitadas
+
+def _registros_contas(validas, indice=None, invalida=None):
+    """Resolve fornecedores e categorias (criando os ausentes) e monta os registros de `contas`."""
+    if validas.empty:
+        return []
+    forn_ids = resolve_fornecedores_lote(zip(validas["fornecedor"], validas["cnpj"]), indice, invalida)
+    cat_ids = resolve_categorias_lote(validas["categoria"], indice, invalida)
+    registros = validas.drop(columns=["fornecedor", "categoria", "cnpj"])
+    registros.insert(0, "categoria_id", _objeto(validas["categoria"].map(_norm_nome).map(cat_ids).astype("Int64")))
+    registros.insert(0, "fornecedor_id", _objeto(validas["fornecedor"].map(_norm_nome).map(forn_ids).astype("Int64")))
+    return registros.to_dict("records")
+
+def importar_contas_blocos(blocos, col_mapping, chunk_size=IMPORT_CHUNK_SIZE, on_lote=None, checkpoint=None, indice=None, invalida=None):
+    """Pipeline de importação em fluxo: bloco lido → normalizado → validado → ids resolvidos → inserido.
+
+    `blocos` é um iterável de DataFrames (ex.: `le_planilha_blocos`); só um
+    bloco fica em memória por vez e cada um é gravado antes do próximo ser
+    lido. A falha de um lote é registrada e não interrompe o arquivo; se a
+    resolução de fornecedores/categorias de um bloco falhar, todos os lotes
+    dele que seriam enviados ficam registrados como falhos.
+    `on_lote(parcial)` recebe o resultado parcial após cada lote, com o
+    `checkpoint` ({"linha": início do bloco, "lote": lotes enviados nele,
+    "falhos": [[linha, lote], ...] dos que deram erro}); passado de volta, os
+    blocos e lotes já enviados são pulados sem gravar, exceto os falhos, que
+    são reenviados. `indice` e `invalida` substituem o índice de resolução da
+    sessão e `invalidate_tables` (uso fora do script).
+
+    Retorna dict com `inseridas`, `rejeitadas` (linhas inválidas), `falhas`
+    (lotes com erro), `feitas` (linhas enviadas), `segundos` e `checkpoint`.
+    """
+    inicio = time.perf_counter()
+    invalida = invalida or invalidate_tables
+    retomar = dict(checkpoint or {"linha": 1, "lote": 0})
+    falhos = {tuple(f) for f in retomar.get("falhos", [])}
+    checkpoint = {"linha": retomar["linha"], "lote": retomar["lote"], "falhos": [list(f) for f in sorted(falhos)]}
+    inseridas = 0
+    rejeitadas = []
+    falhas = []
+    feitas = 0
+    primeira_linha = 1
+
+    def _parcial():
+        return {"inseridas": inseridas, "rejeitadas": rejeitadas, "falhas": falhas, "feitas": feitas,
+                "segundos": time.perf_counter() - inicio, "checkpoint": dict(checkpoint)}
+
+    for bloco in blocos:
+        linha_bloco = primeira_linha
+        primeira_linha += len(bloco)
+        if linha_bloco < retomar["linha"] and not any(f[0] == linha_bloco for f in falhos):
+            continue  # bloco inteiro gravado antes da interrupção
+        validas, rejeitadas_bloco = _valida_bloco_contas(bloco, col_mapping, linha_bloco)
+        erro_bloco = None
+        try:
+            registros = _registros_contas(validas, indice, invalida)
+        except Exception as e:
+            # Sem os ids não há o que inserir: os lotes do bloco falham e a retomada os reenvia
+            erro_bloco = str(e)[:300]
+            registros = [None] * len(validas)
+        if linha_bloco < retomar["linha"]:
+            ja_enviados = float("inf")
+        else:
+            ja_enviados = retomar["lote"] if linha_bloco == retomar["linha"] else 0
+        if not ja_enviados:
+            # Em blocos já visitados as rejeitadas foram contadas na execução anterior
+            rejeitadas.extend(rejeitadas_bloco)
+        for n_bloco, lote in enumerate(_chunks(registros, chunk_size), start=1):
+            reenvio = n_bloco <= ja_enviados
+            if reenvio and (linha_bloco, n_bloco) not in falhos:
+                continue
+            try:
+                if erro_bloco is not None:
+                    raise RuntimeError(erro_bloco)  # ids não resolvidos: o lote falha como um insert com erro
+                sb.table("contas").insert(lote).execute()
+                invalida("contas")
+                inseridas += len(lote)
+                falhos.discard((linha_bloco, n_bloco))
+            except Exception as e:
+                falhas.append({"linha": linha_bloco, "lote": n_bloco, "linhas": len(lote), "erro": str(e)[:300]})
+                falhos.add((linha_bloco, n_bloco))
+            if not reenvio:
+                feitas += len(lote)  # reenviados já foram contados na execução anterior
+                checkpoint.update(linha=linha_bloco, lote=n_bloco)
+            checkpoint["falhos"] = [list(f) for f in sorted(falhos)]
+            if on_lote:
+                on_lote(_parcial())
+
+    return _parcial()
+
+# Importações em segundo plano: o motor roda numa thread e o estado fica em `importacoes`
+IMPORTACAO_POLL = float(env_get("IMPORTACAO_POLL") or 1.0)  # segundos entre atualizações do progresso
+IMPORTACAO_RECENTE = 600  # concluídas há menos que isso continuam no painel (segundos)
+IMPORTACAO_BATIMENTO = 30  # segundos entre batimentos da thread na linha de `importacoes`
+IMPORTACAO_ABANDONO = 120  # sem batimento há mais que isso, a execução é dada como interrompida
+RETOMAVEIS = ["interrompida", "falhou", "concluida_com_falhas"]  # status que aceitam retomada
+DETALHES_MAX = 1000  # linhas rejeitadas / lotes com falha guardados por importação
+CONTADORES_IMPORTACAO = ["feitas", "inseridas", "ignoradas", "rejeitadas", "falhas", "segundos"]
+
+@st.cache_resource
+def _importacoes():
+    """Importações deste processo, compartilhadas entre sessões: {(tipo, impressão): job}.
+
+    As threads só mexem neste dicionário e no banco (nunca em st.*); as tabelas
+    que elas alteram ficam em "pendentes" até a próxima execução do script
+    invalidar o cache (`aplica_invalidacoes_importacao`).
+    """
+    return {"lock": threading.Lock(), "jobs": {}, "pendentes": set()}
+
+def impressao_arquivo(up):
+    """md5 do conteúdo enviado, calculado uma vez por upload na sessão."""
+    impressoes = st.session_state.setdefault("_impressoes", {})
+    chave = getattr(up, "file_id", None) or (up.name, up.size)
+    if chave not in impressoes:
+        impressoes[chave] = hashlib.md5(up.getvalue()).hexdigest()
+    return impressoes[chave]
+
+def aplica_invalidacoes_importacao():
+    """Invalida o cache das tabelas gravadas pelas importações desde a última execução."""
+    registro = _importacoes()
+    with registro["lock"]:
+        pendentes, registro["pendentes"] = registro["pendentes"], set()
+    if pendentes:
+        invalidate_tables(*pendentes)
+
+def _job_da_linha(row):
+    """Job a partir de uma linha de `importacoes` (execução de outro processo ou anterior)."""
+    detalhes = row.get("detalhes") or {}
+    return {
+        "id": row["id"], "tipo": row["tipo"], "arquivo": row.get("arquivo"), "impressao": row["impressao"],
+        "usuario": row.get("usuario"), "status": row["status"], "parametros": row.get("parametros") or {},
+        "checkpoint": row.get("checkpoint"), "total": row.get("total"), "progresso": None, "erro": row.get("erro"),
+        "detalhes": {"rejeitadas": detalhes.get("rejeitadas", []), "falhas": detalhes.get("falhas", [])},
+        "atualizado": time.time(),
+        **{k: float(row.get(k) or 0) if k == "segundos" else int(row.get(k) or 0) for k in CONTADORES_IMPORTACAO},
+    }
+
+def _salva_importacao(job):
+    """Grava o estado do job em `importacoes` (sem a tabela, o job segue só em memória)."""
+    linha = {k: job[k] for k in ["tipo", "arquivo", "impressao", "usuario", "status", "parametros", "checkpoint", "total", "erro", "detalhes"] + CONTADORES_IMPORTACAO}
+    try:
+        if job["id"] is None:
+            res = sb.table("importacoes").insert(linha).execute()
+            job["id"] = int(res.data[0]["id"])
+        else:
+            sb.table("importacoes").update(linha).eq("id", job["id"]).execute()
+    except Exception as e:
+        logger.warning("Estado da importação %s não gravado: %s", job["arquivo"], str(e)[:300])
+
+def _marca_abandonada(job_id):
+    """True se a linha "executando" está sem batimento e foi marcada "interrompida" agora."""
+    try:
+        res = sb.rpc("marca_importacao_abandonada", {"p_id": job_id, "p_abandono_segundos": IMPORTACAO_ABANDONO}).execute()
+        return bool(res.data)
+    except Exception as e:
+        logger.debug("Importação %s não verificada: %s", job_id, e)
+        return False
+
+def _reivindica_importacao(job_id):
+    """Volta a linha para "executando" só se ainda estiver retomável (uma sessão vence)."""
+    try:
+        res = (sb.table("importacoes").update({"status": "executando"})
+               .eq("id", job_id).in_("status", RETOMAVEIS).execute())
+        return bool(res.data)
+    except Exception as e:
+        logger.warning("Importação %s não reivindicada: %s", job_id, str(e)[:300])
+        return False
+
+def importacao_do_arquivo(tipo, impressao):
+    """Última importação deste arquivo: a do processo ou, se não houver, a de `importacoes`.
+
+    Uma linha "executando" no banco sem thread neste processo pode estar rodando
+    em outro processo: só vira "interrompida" (e pode ser retomada) quando o
+    banco confirma que está sem batimento há IMPORTACAO_ABANDONO segundos.
+    """
+    registro = _importacoes()
+    with registro["lock"]:
+        job = registro["jobs"].get((tipo, impressao))
+        if job is not None:
+            return dict(job)
+    try:
+        rows = (sb.table("importacoes").select("*").eq("tipo", tipo).eq("impressao", impressao)
+                .order("id", desc=True).limit(1).execute().data or [])
+    except Exception:
+        return None
+    if not rows:
+        return None
+    job = _job_da_linha(rows[0])
+    if job["status"] == "executando" and _marca_abandonada(job["id"]):
+        job["status"] = "interrompida"
+    return job
+
+def _acumula_importacao(job, base, parcial):
+    """Totais do job = os de antes da retomada (`base`) + o parcial desta execução."""
+    for k in ("feitas", "inseridas", "ignoradas", "segundos"):
+        job[k] = base[k] + parcial.get(k, 0)
+    job["rejeitadas"] = base["rejeitadas"] + len(parcial.get("rejeitadas", []))
+    job["falhas"] = base["falhas"] + sum(f["linhas"] for f in parcial["falhas"])
+    for k in ("rejeitadas", "falhas"):
+        job["detalhes"][k] = (base["detalhes"][k] + list(parcial.get(k, [])))[:DETALHES_MAX]
+    job["checkpoint"] = parcial["checkpoint"]
+    if job["total"]:
+        job["progresso"] = min(job["feitas"] / job["total"], 1.0)
+    job["atualizado"] = time.time()
+
+def _executa_importacao(job, motor, registro):
+    """Corpo da thread: roda `motor(checkpoint, on_lote, invalida)` e grava o estado a cada lote."""
+    base = {k: job[k] for k in CONTADORES_IMPORTACAO}
+    base["detalhes"] = {k: list(v) for k, v in job["detalhes"].items()}
+    if "falhos" in (job["checkpoint"] or {}):
+        # Os lotes com falha do checkpoint são reenviados: as falhas voltam a ser contadas nesta execução
+        base["falhas"], base["detalhes"]["falhas"] = 0, []
+
+    def _invalida(*tabelas):
+        with registro["lock"]:
+            registro["pendentes"].update(tabelas)
+
+    def _on_lote(parcial):
+        with registro["lock"]:
+            _acumula_importacao(job, base, parcial)
+            if "progresso" in parcial:
+                job["progresso"] = parcial["progresso"]
+        _salva_importacao(job)
+
+    parar = threading.Event()
+
+    def _batimento():
+        # Lotes lentos não deixam a linha parada: outro processo a daria como abandonada
+        while not parar.wait(IMPORTACAO_BATIMENTO):
+            try:
+                sb.table("importacoes").update({"status": "executando"}).eq("id", job["id"]).eq("status", "executando").execute()
+            except Exception as e:
+                logger.debug("Batimento da importação %s falhou: %s", job["id"], e)
+
+    if job["id"] is not None:
+        threading.Thread(target=_batimento, name=f"batimento-{job['id']}", daemon=True).start()
+    try:
+        parcial = motor(job["checkpoint"], _on_lote, _invalida)
+        with registro["lock"]:
+            _acumula_importacao(job, base, parcial)
+            job["status"] = "concluida_com_falhas" if parcial["checkpoint"].get("falhos") else "concluida"
+            job["progresso"] = 1.0
+    except Exception as e:
+        logger.exception("Importação %s falhou", job["arquivo"])
+        with registro["lock"]:
+            job["status"], job["erro"] = "falhou", str(e)[:300]
+    parar.set()
+    _salva_importacao(job)
+
+def inicia_importacao(tipo, arquivo, impressao, motor, parametros=None, total=None, retomar=None):
+    """Dispara a importação numa thread e devolve o job (um por arquivo e tipo).
+
+    `motor(checkpoint, on_lote, invalida)` faz o trabalho (ex.: `importar_contas_blocos`)
+    e não pode usar st.*. Com `retomar` (job interrompido ou com falha), os
+    contadores continuam dele e o motor recomeça do checkpoint; se outra
+    sessão ou processo já a retomou, devolve None sem iniciar nada.
+    """
+    if retomar and retomar.get("id") is not None and not _reivindica_importacao(retomar["id"]):
+        return None
+    registro = _importacoes()
+    chave = (tipo, impressao)
+    with registro["lock"]:
+        atual = registro["jobs"].get(chave)
+        if atual is not None and atual["status"] == "executando":
+            return dict(atual)
+        job = dict(retomar) if retomar else {
+            "id": None, "tipo": tipo, "impressao": impressao, "checkpoint": None, "progresso": 0.0,
+            "detalhes": {"rejeitadas": [], "falhas": []}, **{k: 0 for k in CONTADORES_IMPORTACAO},
+        }
+        job.update({
+            "arquivo": arquivo, "usuario": st.session_state.get("username"), "status": "executando",
+            "parametros": parametros or {}, "total": total, "erro": None, "atualizado": time.time(),
+        })
+        job["detalhes"] = {k: list(v) for k, v in job["detalhes"].items()}
+        registro["jobs"][chave] = job
+    _salva_importacao(job)
+    threading.Thread(target=_executa_importacao, args=(job, motor, registro), name=f"importacao-{tipo}", daemon=True).start()
+    return dict(job)
+
+def importacoes_do_tipo(tipo):
+    """Importações do processo em andamento ou concluídas há pouco (mais recentes primeiro)."""
+    registro = _importacoes()
+    agora = time.time()
+    with registro["lock"]:
+        jobs = [dict(j) for (t, _), j in registro["jobs"].items()
+                if t == tipo and (j["status"] == "executando" or agora - j["atualizado"] <= IMPORTACAO_RECENTE)]
+    return sorted(jobs, key=lambda j: (j["status"] != "executando", -j["atualizado"]))
+
+def mostra_importacao(job):
+    """Progresso ou resultado de uma importação."""
+    taxa = job["feitas"] / job["segundos"] if job["segundos"] > 0 else 0.0
+    resumo = (
+        f"{job['feitas']} linhas enviadas • {job['inseridas']} inseridas"
+        + (f" • {job['ignoradas']} já existentes" if job["ignoradas"] else "")
+        + (f" • {job['rejeitadas']} rejeitadas" if job["rejeitadas"] else "")
+        + (f" • {job['falhas']} com falha" if job["falhas"] else "")
+        + f" • {taxa:,.0f} linhas/s"
+    )
+    if job["status"] == "executando":
+        st.info(f"⏳ Importando **{job['arquivo']}** ({job.get('usuario') or '—'})")
+        if job.get("progresso") is not None:
+            st.progress(float(job["progresso"]))
+        st.caption(resumo)
+        return
+    if job["status"] == "concluida":
+        st.success(f"✅ Importação de **{job['arquivo']}** concluída em {job['segundos']:.1f}s: {resumo}.")
+    elif job["status"] == "concluida_com_falhas":
+        st.warning(f"⚠️ Importação de **{job['arquivo']}** concluída com falhas: {resumo}. Os lotes com falha podem ser reenviados.")
+    elif job["status"] == "interrompida":
+        st.warning(f"⚠️ Importação de **{job['arquivo']}** interrompida: {resumo}.")
+    else:
+        st.error(f"❌ Importação de **{job['arquivo']}** falhou: {resumo}.")
+        if _str_to_bool(env_get('DEBUG')) and job.get("erro"):
+            st.caption(job["erro"])
+    if job["detalhes"]["rejeitadas"]:
+        st.warning(f"⚠️ {job['rejeitadas']} linha(s) rejeitada(s) na validação.")
+        st.dataframe(pd.DataFrame(job["detalhes"]["rejeitadas"]), use_container_width=True)
+    if job["detalhes"]["falhas"]:
+        st.error(f"❌ {len(job['detalhes']['falhas'])} lote(s) falharam ao inserir.")
+        if _str_to_bool(env_get('DEBUG')) or job["tipo"] == "contas":
+            st.dataframe(pd.DataFrame(job["detalhes"]["falhas"]), use_container_width=True)
+
+def _painel_importacoes(tipo):
+    jobs = importacoes_do_tipo(tipo)
+    ativas = {j["impressao"] for j in jobs if j["status"] == "executando"}
+    vistas = st.session_state.setdefault("_importacoes_ativas", {})
+    if vistas.get(tipo, set()) - ativas:
+        # Alguma terminou: reexecuta a página inteira para recarregar os dados
+        vistas[tipo] = ativas
+        st.rerun()
+    vistas[tipo] = ativas
+    for job in jobs:
+        mostra_importacao(job)
+
+def painel_importacoes(tipo):
+    """Importações do tipo feitas neste processo (por qualquer sessão).
+
+    Com importação em andamento e `st.fragment` disponível, só o painel é
+    reexecutado a cada IMPORTACAO_POLL segundos; sem ele, a página inteira
+    (ver `aguarda_importacoes`). Retorna os jobs exibidos.
+    """
+    jobs = importacoes_do_tipo(tipo)
+    fragmento = getattr(st, "fragment", None)
+    if fragmento is not None and any(j["status"] == "executando" for j in jobs):
+        fragmento(run_every=IMPORTACAO_POLL)(_painel_importacoes)(tipo)
+    else:
+        _painel_importacoes(tipo)
+    return jobs
+
+def acao_importacao(job, key):
+    """Botões conforme a última importação do arquivo: "iniciar", "retomar" ou None."""
+    if job is None:
+        return "iniciar" if st.button("▶️ Iniciar importação", key=f"{key}_iniciar") else None
+    col1, col2 = st.columns(2)
+    if job["status"] in RETOMAVEIS and job.get("checkpoint"):
+        retomar = "⏯️ Reenviar lotes com falha" if job["status"] == "concluida_com_falhas" else "⏯️ Retomar de onde parou"
+        if col1.button(retomar, key=f"{key}_retomar"):
+            return "retomar"
+        rotulo = "🔁 Recomeçar do início"
+    else:
+        rotulo = "🔁 Importar novamente" if job["status"] == "concluida" else "🔁 Tentar novamente"
+    return "iniciar" if col2.button(rotulo, key=f"{key}_iniciar") else None
+
+def aguarda_importacoes(jobs):
+    """Sem `st.fragment`, reexecuta a página a cada IMPORTACAO_POLL segundos enquanto houver importação."""
+    ativa = any(j["status"] == "executando" for j in jobs)
+    if ativa and getattr(st, "fragment", None) is None:
+        time.sleep(IMPORTACAO_POLL)
+        st.rerun()
+
+# Seletor de contas: acima deste número de opções vira busca no servidor
+PICKER_LIMITE = int(env_get("PICKER_LIMITE") or 500)
+
+def _filtro_busca_conta(termo):
+    """Expressão `or` do PostgREST para buscar contas por texto (ilike) ou #id."""
+    limpo = termo.replace('"', "").replace("\\", "").strip()
+    expr = [f'{c}.ilike."*{limpo}*"' for c in ("descricao", "empresa", "numero_documento")]
+    if limpo.lstrip("#").isdigit():
+        expr.append(f"id.eq.{int(limpo.lstrip('#'))}")
+    return ",".join(expr)
+
+def seletor_conta(rotulo, contas, partes, sep=" | ", status=None, select="*", embed=None, key=None):
+    """Selectbox de contas com rótulos pré-calculados (busca O(1) do rótulo por id).
+
+    Com mais de PICKER_LIMITE opções, mostra um campo de busca e consulta o
+    servidor (ilike em descrição, empresa e nº do documento, ou #id), restrito a
+    `status`, exibindo só os resultados. Retorna (id, linha) ou (None, None).
+    """
+    key = key or rotulo
+    if len(contas) > PICKER_LIMITE:
+        termo = st.text_input(f"{rotulo} (buscar por descrição, empresa, documento ou #id)", key=f"{key}_busca").strip()
+        if not termo:
+            st.caption(f"{len(contas)} contas disponíveis: digite para buscar.")
+            return None, None
+        filtros = [("in_", "status", list(status))] if status else []
+        filtros.append(("or_", None, _filtro_busca_conta(termo)))
+        contas, total = fetch_page("contas", select=select, filters=filtros, limit=PICKER_LIMITE, embed=embed)
+        if contas.empty:
+            st.info("Nenhuma conta encontrada para a busca.")
+            return None, None
+        if total > len(contas):
+            st.caption(f"Mostrando {len(contas)} de {total} contas encontradas; refine a busca.")
+    rotulos = rotulos_contas(contas, partes, sep)
+    conta_id = st.selectbox(rotulo, options=list(rotulos), format_func=rotulos.get, key=key)
+    if conta_id is None:
+        return None, None
+    return conta_id, contas[contas["id"].astype("int64") == conta_id].iloc[0]
+
+# Valores aceitos pela constraint de status em public.contas
+STATUS_CONTA = ["provisionado", "aprovado", "pago", "cancelado"]
+
+# Colunas de contas que cada página usa (fornecedor/categoria vêm por `embed`)
+COLUNAS_PAGINA = {
+    "Lançar Contas": [
+        "id", "empresa", "centro_custo", "classificacao_gastos", "area", "cidade", "uf", "descricao",
+        "numero_documento", "competencia", "vencimento", "valor_previsto", "status", "criado_em", "criado_por",
+    ],
+    "Aprovações": ["id", "empresa", "descricao", "vencimento", "valor_previsto", "status"],
+    "Pagamentos/Conciliação": [
+        "id", "empresa", "descricao", "competencia", "vencimento", "valor_previsto", "status", "criado_em", "atualizado_em",
+    ],
+    "Dashboard": ["id", "empresa", "descricao", "vencimento", "valor_previsto", "status", "categoria_id"],
+}
 
 st.sidebar.title("💸 Contas a Pagar")
 
@@ -309,6 +1582,7 @@ if st.session_state.get('username'):
     st.sidebar.markdown("---")
 
 page = st.sidebar.radio("Navegar", ["Lançar Contas", "Cadastro de Contas", "Aprovações", "Pagamentos/Conciliação", "Dashboard", "ETL/Importação", "Gerenciar Usuários"], index=0)
+inicia_execucao(page)
 
 # Botão de logout
 st.sidebar.markdown("---")
@@ -317,54 +1591,23 @@ if st.sidebar.button("🚪 Sair", use_container_width=True):
 
 if page == "Lançar Contas":
     st.header("Lançamento / Provisionamento de Contas")
-    # Carrega opções vindas do cadastro de contas
-    cadastro_df = fetch_table("cadastro_contas")
-    empresas_opts = []
-    razoes_opts = []
-    cat_titulo_opts = []
-    centro_custo_opts = []
-    class_gastos_opts = []
-    area_opts = []
-    cidade_opts = []
-    uf_opts = []
-    razao_to_cnpj = {}
-    if not cadastro_df.empty:
-        if "empresa" in cadastro_df.columns:
-            empresas_opts = sorted([e for e in cadastro_df["empresa"].dropna().astype(str).str.strip().unique().tolist() if e])
-        if "razao_social" in cadastro_df.columns:
-            razoes_opts = sorted([r for r in cadastro_df["razao_social"].dropna().astype(str).str.strip().unique().tolist() if r])
-            # Mapeia a primeira ocorrência de CNPJ para cada razão social
-            if "cnpj" in cadastro_df.columns:
-                temp = cadastro_df.dropna(subset=["razao_social"]).copy()
-                temp["razao_social"] = temp["razao_social"].astype(str).str.strip()
-                temp = temp.sort_values("criado_em") if "criado_em" in temp.columns else temp
-                for _, row in temp.iterrows():
-                    rs = row.get("razao_social")
-                    cnpj_val = row.get("cnpj")
-                    if rs and rs not in razao_to_cnpj and pd.notna(cnpj_val) and str(cnpj_val).strip():
-                        razao_to_cnpj[rs] = str(cnpj_val)
-        if "categoria_titulo" in cadastro_df.columns:
-            cat_titulo_opts = sorted([c for c in cadastro_df["categoria_titulo"].dropna().astype(str).str.strip().unique().tolist() if c])
-        if "centro_custo" in cadastro_df.columns:
-            centro_custo_opts = sorted([c for c in cadastro_df["centro_custo"].dropna().astype(str).str.strip().unique().tolist() if c])
-        if "classificacao_gastos" in cadastro_df.columns:
-            class_gastos_opts = sorted([c for c in cadastro_df["classificacao_gastos"].dropna().astype(str).str.strip().unique().tolist() if c])
-        if "area" in cadastro_df.columns:
-            area_opts = sorted([c for c in cadastro_df["area"].dropna().astype(str).str.strip().unique().tolist() if c])
-        if "cidade" in cadastro_df.columns:
-            cidade_opts = sorted([c for c in cadastro_df["cidade"].dropna().astype(str).str.strip().unique().tolist() if c])
-        if "uf" in cadastro_df.columns:
-            uf_opts = sorted([c for c in cadastro_df["uf"].dropna().astype(str).str.strip().unique().tolist() if c])
+    # Carrega opções vindas do cadastro de contas (catálogo em cache, compartilhado entre sessões)
+    catalogo = catalogo_lancamento()
+    opcoes = catalogo["opcoes"]
+    empresas_opts = opcoes["empresa"]
+    razoes_opts = opcoes["razao_social"]
+    cat_titulo_opts = opcoes["categoria_titulo"]
+    centro_custo_opts = opcoes["centro_custo"]
+    class_gastos_opts = opcoes["classificacao_gastos"]
+    area_opts = opcoes["area"]
+    cidade_opts = opcoes["cidade"]
+    uf_opts = opcoes["uf"]
+    razao_to_cnpj = catalogo["razao_to_cnpj"]
     # Valores padrão se não houver cadastro
     if not cat_titulo_opts:
         cat_titulo_opts = ["Geral"]
     # Verifica colunas existentes em 'contas' para salvar extras sem erro
-    contas_cols = []
-    try:
-        _df_contas_probe = fetch_table("contas")
-        contas_cols = list(_df_contas_probe.columns)
-    except Exception:
-        contas_cols = []
+    contas_cols = colunas_tabela("contas")
     # Seletores reativos (fora do form) para permitir atualizar CNPJ automaticamente
     cols_top = st.columns(2)
     empresa_sel = cols_top[0].selectbox("Empresa *", options=empresas_opts or [""], index=0, key="launch_empresa")
@@ -441,137 +1684,126 @@ if page == "Lançar Contas":
                             payload_conta[k] = v
                     insert("contas", payload_conta)
                     st.success("Conta provisionada com sucesso!")
-    df = fetch_table("contas", order="criado_em")
-    if not df.empty:
-        # Prepara dados para exibição
-        df_display = df.copy()
-        df_display["valor_previsto"] = df_display["valor_previsto"].apply(money)
-        
-        # Busca nomes dos fornecedores e categorias
-        fornecedores = fetch_table("fornecedores")
-        categorias = fetch_table("categorias")
-        
-        if not fornecedores.empty:
-            fornecedor_map = dict(zip(fornecedores["id"], fornecedores["nome"]))
-            df_display["fornecedor_nome"] = df_display["fornecedor_id"].map(fornecedor_map)
-        
-        if not categorias.empty:
-            categoria_map = dict(zip(categorias["id"], categorias["nome"]))
-            df_display["categoria_nome"] = df_display["categoria_id"].map(categoria_map)
-        
-        # Filtros para a tabela de contas
-        st.subheader("🔍 Filtros de Pesquisa")
-        
-        col1, col2, col3 = st.columns(3)
-        
-        with col1:
-            # Filtro por empresa
-            empresas_unicas = ["Todos"] + sorted(df_display["empresa"].dropna().unique().tolist())
-            empresa_filtro = st.selectbox("Empresa", empresas_unicas)
-            
-            # Filtro por status
-            status_unicos = ["Todos"] + sorted(df_display["status"].dropna().unique().tolist())
-            status_filtro = st.selectbox("Status", status_unicos)
-        
-        with col2:
-            # Filtro por fornecedor
-            fornecedores_unicos = ["Todos"] + sorted(df_display["fornecedor_nome"].dropna().unique().tolist())
-            fornecedor_filtro = st.selectbox("Fornecedor", fornecedores_unicos)
-            
-            # Filtro por categoria
-            categorias_unicas = ["Todos"] + sorted(df_display["categoria_nome"].dropna().unique().tolist())
-            categoria_filtro = st.selectbox("Categoria", categorias_unicas)
-        
-        with col3:
-            # Filtro por valor mínimo
-            valor_min = st.number_input("Valor Mínimo (R$)", min_value=0.0, value=0.0, step=0.01)
-            
-            # Filtro por valor máximo
-            # Converte valores monetários para float para calcular o máximo
-            if not df_display.empty:
-                valores_numericos = df_display["valor_previsto"].str.replace("R$", "").str.replace(".", "").str.replace(",", ".").astype(float)
-                valor_max_default = float(valores_numericos.max())
-            else:
-                valor_max_default = 0.0
-            valor_max = st.number_input("Valor Máximo (R$)", min_value=0.0, value=valor_max_default, step=0.01)
-
-        # Filtro por faixa de vencimento
-        # Calcula datas mínima e máxima
-        dates_series = pd.to_datetime(df_display.get("vencimento"), errors="coerce") if not df_display.empty else pd.Series([], dtype="datetime64[ns]")
-        if not dates_series.dropna().empty:
-            min_date_default = dates_series.min().date()
-            max_date_default = dates_series.max().date()
-        else:
-            today_default = datetime.today().date()
-            min_date_default = today_default
-            max_date_default = today_default
-        col_dt1, col_dt2 = st.columns(2)
-        venc_ini = col_dt1.date_input("Vencimento de", value=min_date_default)
-        venc_fim = col_dt2.date_input("Vencimento até", value=max_date_default)
-        
-        # Filtro de busca por texto
-        st.write("**🔍 Busca por Texto:**")
-        col_busca1, col_busca2 = st.columns(2)
-        
-        with col_busca1:
-            busca_descricao = st.text_input("Buscar na Descrição", placeholder="Digite parte da descrição...")
-        
-        with col_busca2:
-            busca_documento = st.text_input("Buscar no Número do Documento", placeholder="Digite o número do documento...")
-        
-        # Botão para limpar filtros
-        col_limpar, col_espaco = st.columns([1, 4])
-        with col_limpar:
-            if st.button("🗑️ Limpar Filtros", type="secondary"):
-                st.rerun()
-        
-        # Aplicar filtros
-        df_filtrado = df_display.copy()
-        
-        if empresa_filtro != "Todos":
-            df_filtrado = df_filtrado[df_filtrado["empresa"] == empresa_filtro]
-        
-        if status_filtro != "Todos":
-            df_filtrado = df_filtrado[df_filtrado["status"] == status_filtro]
-        
-        if fornecedor_filtro != "Todos":
-            df_filtrado = df_filtrado[df_filtrado["fornecedor_nome"] == fornecedor_filtro]
-        
-        if categoria_filtro != "Todos":
-            df_filtrado = df_filtrado[df_filtrado["categoria_nome"] == categoria_filtro]
+    # Grade de contas: filtros e paginação executados no servidor (PostgREST)
+    fornecedores = fetch_table("fornecedores", select="id,nome")
+    categorias = fetch_table("categorias", select="id,nome")
+    fornecedor_map = dict(zip(fornecedores["id"], fornecedores["nome"])) if not fornecedores.empty else {}
+    categoria_map = dict(zip(categorias["id"], categorias["nome"])) if not categorias.empty else {}
+
+    # Empresas do cadastro e as já usadas em contas (distintas no servidor, em cache como o catálogo)
+    opcoes_empresa_grade = empresas_grade(empresas_opts)
+
+    # Filtros para a tabela de contas
+    st.subheader("🔍 Filtros de Pesquisa")
+    
+    col1, col2, col3 = st.columns(3)
+    
+    with col1:
+        # Filtro por empresa
+        empresa_filtro = st.selectbox("Empresa", ["Todos"] + opcoes_empresa_grade)
         
-        # Aplica filtro de data de vencimento (faixa)
-        if "vencimento" in df_filtrado.columns:
-            venc_series = pd.to_datetime(df_filtrado["vencimento"], errors="coerce").dt.date
-            if venc_ini:
-                df_filtrado = df_filtrado[venc_series >= venc_ini]
-            if venc_fim:
-                df_filtrado = df_filtrado[venc_series <= venc_fim]
-
-        if valor_min > 0 or valor_max > 0:
-            # Converte valores monetários para float para comparação
-            valores_numericos = df_filtrado["valor_previsto"].str.replace("R$", "").str.replace(".", "").str.replace(",", ".").astype(float)
-            
-            if valor_min > 0:
-                df_filtrado = df_filtrado[valores_numericos >= valor_min]
-            
-            if valor_max > 0:
-                df_filtrado = df_filtrado[valores_numericos <= valor_max]
+        # Filtro por status
+        status_filtro = st.selectbox("Status", ["Todos"] + STATUS_CONTA)
+    
+    with col2:
+        # Filtro por fornecedor
+        fornecedores_unicos = ["Todos"] + sorted({str(n) for n in fornecedor_map.values() if n})
+        fornecedor_filtro = st.selectbox("Fornecedor", fornecedores_unicos)
         
-        # Aplicar filtros de busca por texto
-        if busca_descricao:
-            df_filtrado = df_filtrado[df_filtrado["descricao"].astype(str).str.contains(busca_descricao, case=False, na=False)]
+        # Filtro por categoria
+        categorias_unicas = ["Todos"] + sorted({str(n) for n in categoria_map.values() if n})
+        categoria_filtro = st.selectbox("Categoria", categorias_unicas)
+    
+    with col3:
+        # Filtro por valor mínimo
+        valor_min = st.number_input("Valor Mínimo (R$)", min_value=0.0, value=0.0, step=0.01)
         
-        if busca_documento:
-            df_filtrado = df_filtrado[df_filtrado["numero_documento"].astype(str).str.contains(busca_documento, case=False, na=False)]
+        # Filtro por valor máximo (padrão: maior valor cadastrado, buscado no servidor)
+        maior_valor = fetch_table("contas", select="valor_previsto", order="valor_previsto", limit=1)
+        maior_centavos = centavos(maior_valor["valor_previsto"]).iloc[0] if not maior_valor.empty else pd.NA
+        valor_max_default = 0.0 if pd.isna(maior_centavos) else int(maior_centavos) / 100
+        valor_max = st.number_input("Valor Máximo (R$)", min_value=0.0, value=valor_max_default, step=0.01)
+
+    # Filtro por faixa de vencimento (padrões: menor e maior vencimento no servidor)
+    primeiro_venc = fetch_table("contas", select="vencimento", order="vencimento", desc=False, limit=1)
+    ultimo_venc = fetch_table("contas", select="vencimento", order="vencimento", limit=1)
+    today_default = datetime.today().date()
+    min_date_default = primeiro_venc["vencimento"].iloc[0].date() if not primeiro_venc.empty else today_default
+    max_date_default = ultimo_venc["vencimento"].iloc[0].date() if not ultimo_venc.empty else today_default
+    col_dt1, col_dt2 = st.columns(2)
+    venc_ini = col_dt1.date_input("Vencimento de", value=min_date_default)
+    venc_fim = col_dt2.date_input("Vencimento até", value=max_date_default)
+    
+    # Filtro de busca por texto
+    st.write("**🔍 Busca por Texto:**")
+    col_busca1, col_busca2 = st.columns(2)
+    
+    with col_busca1:
+        busca_descricao = st.text_input("Buscar na Descrição", placeholder="Digite parte da descrição...")
+    
+    with col_busca2:
+        busca_documento = st.text_input("Buscar no Número do Documento", placeholder="Digite o número do documento...")
+    
+    # Botão para limpar filtros
+    col_limpar, col_espaco = st.columns([1, 4])
+    with col_limpar:
+        if st.button("🗑️ Limpar Filtros", type="secondary"):
+            st.rerun()
+    
+    # Traduz os filtros para a consulta PostgREST
+    filtros = []
+    if empresa_filtro != "Todos":
+        filtros.append(("eq", "empresa", empresa_filtro))
+    if status_filtro != "Todos":
+        filtros.append(("eq", "status", status_filtro))
+    if fornecedor_filtro != "Todos":
+        filtros.append(("in_", "fornecedor_id", [int(i) for i, n in fornecedor_map.items() if n == fornecedor_filtro]))
+    if categoria_filtro != "Todos":
+        filtros.append(("in_", "categoria_id", [int(i) for i, n in categoria_map.items() if n == categoria_filtro]))
+    if venc_ini:
+        filtros.append(("gte", "vencimento", venc_ini.isoformat()))
+    if venc_fim:
+        filtros.append(("lte", "vencimento", venc_fim.isoformat()))
+    # Faixa de valor em centavos inteiros, enviada ao servidor com 2 casas exatas
+    valor_min_c = int(round(valor_min * 100))
+    valor_max_c = int(round(valor_max * 100))
+    if valor_min_c > 0:
+        filtros.append(("gte", "valor_previsto", f"{valor_min_c / 100:.2f}"))
+    if valor_max_c > 0:
+        filtros.append(("lte", "valor_previsto", f"{valor_max_c / 100:.2f}"))
+    if busca_descricao:
+        filtros.append(("ilike", "descricao", f"%{busca_descricao}%"))
+    if busca_documento:
+        filtros.append(("ilike", "numero_documento", f"%{busca_documento}%"))
+
+    # Paginação por chave (criado_em, id); volta à primeira página quando os filtros mudam
+    tamanho_pagina = st.selectbox("Contas por página", [50, 100, 200, 500], index=1)
+    assinatura = repr((_filters_key(filtros), tamanho_pagina))
+    if st.session_state.get("contas_grid_assinatura") != assinatura:
+        st.session_state["contas_grid_assinatura"] = assinatura
+        st.session_state["contas_grid_cursores"] = [None]
+    cursores = st.session_state["contas_grid_cursores"]
+    colunas_contas = projecao("contas", COLUNAS_PAGINA["Lançar Contas"])
+    df, total = fetch_page("contas", select=colunas_contas, filters=filtros, limit=tamanho_pagina, after=cursores[-1], embed=("fornecedor", "categoria"))
+    
+    # Mostrar resultados filtrados
+    st.write(f"**📊 Resultados encontrados: {total} contas** (página {len(cursores)})")
+    
+    if not df.empty:
+        # Coluna numérica (centavos) para cálculos; texto formatado só para exibição
+        df["valor_centavos"] = centavos(df["valor_previsto"])
         
-        # Mostrar resultados filtrados
-        st.write(f"**📊 Resultados encontrados: {len(df_filtrado)} contas**")
+        # Prepara dados para exibição (apenas a página atual)
+        df_display = df.copy()
+        df_display["valor_previsto"] = (df["valor_centavos"] / 100).map(money)
+        for col in ["competencia", "vencimento"]:
+            if col in df_display.columns:
+                df_display[col] = datas_texto(df_display[col])
         
         # Anexa usuário criador ao campo 'criado_em' se disponível
-        if "criado_por" in df_filtrado.columns:
+        if "criado_por" in df_display.columns:
             try:
-                df_filtrado["criado_em"] = df_filtrado.apply(lambda r: f"{r.get('criado_em','')} - {r.get('criado_por','')}", axis=1)
+                df_display["criado_em"] = df_display.apply(lambda r: f"{r.get('criado_em','')} - {r.get('criado_por','')}", axis=1)
             except Exception:
                 pass
 
@@ -582,33 +1814,44 @@ if page == "Lançar Contas":
             "descricao", "numero_documento", "competencia", "vencimento",
             "valor_previsto", "status", "criado_em"
         ]
-        available_cols = [col for col in cols_to_show if col in df_filtrado.columns]
+        available_cols = [col for col in cols_to_show if col in df_display.columns]
         
-        st.dataframe(df_filtrado[available_cols], use_container_width=True)
+        st.dataframe(df_display[available_cols], use_container_width=True)
+    
+    col_ant, col_pag, col_prox = st.columns([1, 3, 1])
+    with col_ant:
+        if st.button("◀ Anterior", disabled=len(cursores) <= 1):
+            cursores.pop()
+            st.rerun()
+    with col_prox:
+        if st.button("Próxima ▶", disabled=df.empty or len(df) < tamanho_pagina):
+            ultima = df.iloc[-1]
+            cursores.append((ultima["criado_em"], int(ultima["id"])))
+            st.rerun()
         
-        # Seção de exclusão de contas
+    if not df.empty:
+        # Seção de exclusão de contas (contas da página atual)
         st.subheader("🗑️ Excluir Conta")
-        if not df.empty:
-            # Cria opções para exclusão
-            df["label"] = df.apply(lambda r: f'#{int(r["id"])} - {r.get("empresa","N/A")} | {r.get("fornecedor_nome","N/A")} | Venc: {r.get("vencimento","")} | {money(r.get("valor_previsto",0))} | Status: {r.get("status","")}', axis=1)
-            
-            col1, col2 = st.columns([3, 1])
-            with col1:
-                conta_excluir = st.selectbox("Selecione a conta para excluir", options=df["id"], format_func=lambda x: df.loc[df["id"]==x, "label"].values[0])
-            
-            with col2:
-                st.write("")  # Espaçamento
-                st.write("")  # Espaçamento
-                if st.button("🗑️ Excluir", type="secondary"):
-                    if conta_excluir:
-                        # Exclui aprovações relacionadas
-                        sb.table("aprovacoes").delete().eq("conta_id", int(conta_excluir)).execute()
-                        # Exclui pagamentos relacionados  
-                        sb.table("pagamentos").delete().eq("conta_id", int(conta_excluir)).execute()
-                        # Exclui a conta
-                        sb.table("contas").delete().eq("id", int(conta_excluir)).execute()
+        col1, col2 = st.columns([3, 1])
+        with col1:
+            conta_excluir, _ = seletor_conta(
+                "Selecione a conta para excluir", df,
+                [("", "empresa", "N/A"), ("", "fornecedor_nome", "N/A"), ("Venc: ", "vencimento", ""), ("", "valor_previsto", ""), ("Status: ", "status", "")],
+                select=colunas_contas, embed=("fornecedor", "categoria"),
+            )
+        
+        with col2:
+            st.write("")  # Espaçamento
+            st.write("")  # Espaçamento
+            if st.button("🗑️ Excluir", type="secondary"):
+                if conta_excluir:
+                    # Aprovações e pagamentos relacionados saem em cascata
+                    status_exc = delete_contas([conta_excluir])[int(conta_excluir)]
+                    if status_exc == "excluída":
                         st.success("Conta excluída com sucesso!")
                         st.rerun()
+                    else:
+                        st.error(f"Conta não excluída ({status_exc}).")
 
 elif page == "Cadastro de Contas":
     st.header("Cadastro de Contas")
@@ -675,6 +1918,7 @@ elif page == "Cadastro de Contas":
                 else:
                     try:
                         res = sb.table("cadastro_contas").insert(payload_clean).execute()
+                        invalidate_tables("cadastro_contas")
                         if res and getattr(res, "data", None) is not None:
                             st.success("Cadastro salvo com sucesso!")
                         else:
@@ -709,43 +1953,35 @@ elif page == "Cadastro de Contas":
 
 elif page == "Aprovações":
     st.header("Aprovação de Contas (em massa)")
-    contas = fetch_table("contas")
+    resultado_aprovacao = st.session_state.pop("_resultado_aprovacao", None)
+    if resultado_aprovacao:
+        aprovadas_n, ignoradas = resultado_aprovacao
+        if ignoradas:
+            st.warning(f"{ignoradas} conta(s) já não estavam pendentes e foram ignoradas.")
+        st.success(f"{aprovadas_n} conta(s) aprovadas.")
+    # Nomes de fornecedor/categoria vêm embutidos na consulta de contas
+    contas = fetch_table("contas", select=projecao("contas", COLUNAS_PAGINA["Aprovações"]), embed=("fornecedor", "categoria"))
     pendentes = contas[contas["status"].isin(["provisionado"])].copy()
     if pendentes.empty:
         st.info("Não há contas pendentes de aprovação.")
     else:
-        fornecedores = fetch_table("fornecedores")
-        categorias = fetch_table("categorias")
-        fornecedor_map = dict(zip(fornecedores["id"], fornecedores["nome"])) if not fornecedores.empty else {}
-        categoria_map = dict(zip(categorias["id"], categorias["nome"])) if not categorias.empty else {}
-
         # Filtro por vencimento
         st.subheader("Filtro por Vencimento")
-        try:
-            venc_series = pd.to_datetime(pendentes["vencimento"], errors="coerce").dropna()
-            min_date = venc_series.min().date() if not venc_series.empty else datetime.today().date()
-            max_date = venc_series.max().date() if not venc_series.empty else datetime.today().date()
-        except Exception:
-            min_date = max_date = datetime.today().date()
+        venc_series = pendentes["vencimento"].dropna()
+        min_date = venc_series.min().date() if not venc_series.empty else datetime.today().date()
+        max_date = venc_series.max().date() if not venc_series.empty else datetime.today().date()
         colf1, colf2 = st.columns(2)
         f_ini = colf1.date_input("De", value=min_date)
         f_fim = colf2.date_input("Até", value=max_date)
         if f_ini and f_fim:
-            vseries = pd.to_datetime(pendentes["vencimento"], errors="coerce").dt.date
-            pendentes = pendentes[(vseries >= f_ini) & (vseries <= f_fim)]
+            pendentes = pendentes[pendentes["vencimento"].between(pd.Timestamp(f_ini), pd.Timestamp(f_fim))]
 
         # Monta tabela para aprovar
         if pendentes.empty:
             st.info("Nenhuma conta no período selecionado.")
         else:
             df_sel = pendentes.copy()
-            df_sel["fornecedor_nome"] = df_sel["fornecedor_id"].map(fornecedor_map)
-            df_sel["categoria_nome"] = df_sel["categoria_id"].map(categoria_map)
-            # Formata valor
-            try:
-                df_sel["valor_previsto"] = pd.to_numeric(df_sel["valor_previsto"], errors="coerce").fillna(0.0)
-            except Exception:
-                pass
+            df_sel["valor_previsto"] = df_sel["valor_previsto"].fillna(0.0)
             df_sel = df_sel[[
                 "id","empresa","fornecedor_nome","categoria_nome","descricao","vencimento","valor_previsto"
             ]]
@@ -777,48 +2013,36 @@ elif page == "Aprovações":
                 else:
                     aprovador = st.session_state.get("username", "Diretoria")
                     data_ap = datetime.today().strftime("%Y-%m-%d")
-                    ok = 0
-                    for cid in to_approve:
-                        try:
-                            insert("aprovacoes", {
-                                "conta_id": int(cid),
-                                "aprovado_por": aprovador,
-                                "data_aprovacao": data_ap
-                            })
-                            upsert("contas", {"id": int(cid), "status": "aprovado"})
-                            ok += 1
-                        except Exception:
-                            pass
-                    st.success(f"{ok} conta(s) aprovadas.")
-                    st.rerun()
+                    aprovadas_ids = aprovar_contas(to_approve, aprovador, data_ap)
+                    if aprovadas_ids is not None:
+                        # O st.rerun apagaria as mensagens: ficam na sessão e aparecem na próxima execução
+                        st.session_state["_resultado_aprovacao"] = (len(aprovadas_ids), len(to_approve) - len(aprovadas_ids))
+                        st.rerun()
 
     # Tabela de Contas Aprovadas
     st.subheader("📋 Contas Aprovadas")
-    aprovacoes = fetch_table("aprovacoes", order="criado_em")
+    aprovacoes = fetch_table("aprovacoes", select="conta_id,criado_em,aprovado_por", order="criado_em")
     if not aprovacoes.empty:
-        contas_aprovadas = fetch_table("contas")
-        fornecedores = fetch_table("fornecedores")
-        categorias = fetch_table("categorias")
-        fornecedor_map = dict(zip(fornecedores["id"], fornecedores["nome"])) if not fornecedores.empty else {}
-        categoria_map = dict(zip(categorias["id"], categorias["nome"])) if not categorias.empty else {}
-
-        linhas = []
-        for _, ap in aprovacoes.iterrows():
-            conta_rel = contas_aprovadas[contas_aprovadas["id"] == ap["conta_id"]]
-            if conta_rel.empty:
-                continue
-            c = conta_rel.iloc[0]
-            linhas.append({
-                "ID Conta": int(c.get("id")),
-                "Empresa": c.get("empresa","N/A"),
-                "Fornecedor": fornecedor_map.get(c.get("fornecedor_id"), "N/A"),
-                "Categoria": categoria_map.get(c.get("categoria_id"), "N/A"),
-                "Vencimento": c.get("vencimento","N/A"),
-                "Valor": money(c.get("valor_previsto",0)),
-                "Criado em": f"{ap.get('criado_em','')} - {ap.get('aprovado_por','')}"
+        contas_aprovadas = fetch_table("contas", select="id,empresa,vencimento,valor_previsto", embed=("fornecedor", "categoria"))
+
+        # Junta aprovações e contas num único merge (mantém a ordem das aprovações)
+        df_aprov = pd.DataFrame()
+        if not contas_aprovadas.empty:
+            cols_conta = [c for c in ["id","empresa","fornecedor_nome","categoria_nome","vencimento","valor_previsto"] if c in contas_aprovadas.columns]
+            juncao = aprovacoes[["conta_id","criado_em","aprovado_por"]].merge(
+                contas_aprovadas[cols_conta].drop_duplicates("id"),
+                left_on="conta_id", right_on="id", how="inner"
+            )
+            df_aprov = pd.DataFrame({
+                "ID Conta": juncao["id"].astype(int),
+                "Empresa": juncao.get("empresa", "N/A"),
+                "Fornecedor": juncao["fornecedor_nome"].fillna("N/A"),
+                "Categoria": juncao["categoria_nome"].fillna("N/A"),
+                "Vencimento": datas_texto(juncao["vencimento"]) if "vencimento" in juncao else "N/A",
+                "Valor": juncao["valor_previsto"].map(money) if "valor_previsto" in juncao else money(0),
+                "Criado em": juncao["criado_em"].map(str) + " - " + juncao["aprovado_por"].map(str),
             })
-        if linhas:
-            df_aprov = pd.DataFrame(linhas)
+        if not df_aprov.empty:
             st.dataframe(df_aprov, use_container_width=True)
 
             # Excluir contas aprovadas
@@ -848,65 +2072,78 @@ elif page == "Aprovações":
                 if not ids_del:
                     st.warning("Nenhuma conta selecionada para excluir.")
                 else:
-                    ok = 0
-                    for cid in ids_del:
-                        try:
-                            delete_conta(int(cid))
-                            ok += 1
-                        except Exception:
-                            pass
-                    st.success(f"{ok} conta(s) excluídas.")
-                    st.rerun()
+                    resultado_del = delete_contas(ids_del)
+                    falhas_del = {cid: r for cid, r in resultado_del.items() if r != "excluída"}
+                    ok = len(resultado_del) - len(falhas_del)
+                    if falhas_del:
+                        st.warning(f"{ok} conta(s) excluídas; {len(falhas_del)} não excluídas.")
+                        st.dataframe(pd.DataFrame({"ID Conta": list(falhas_del), "Resultado": list(falhas_del.values())}), use_container_width=True)
+                    else:
+                        st.success(f"{ok} conta(s) excluídas.")
+                        st.rerun()
         else:
             st.info("Nenhuma linha para exibir.")
 
 elif page == "Pagamentos/Conciliação":
     st.header("Pagamentos e Conciliação de Extrato")
     st.subheader("Registrar Pagamento")
-    contas = fetch_table("contas")
+    # Mesma consulta usada pela conciliação e pela exclusão: o memo da execução serve as três
+    colunas_contas = projecao("contas", COLUNAS_PAGINA["Pagamentos/Conciliação"])
+    contas = fetch_table("contas", select=colunas_contas, order="criado_em", embed=("fornecedor", "categoria"))
     aprovadas = contas[contas["status"].isin(["aprovado","provisionado"])].copy()
     if aprovadas.empty:
         st.info("Não há contas aprovadas/provisionadas para pagar.")
     else:
-        # Busca nomes dos fornecedores
-        fornecedores = fetch_table("fornecedores")
-        if not fornecedores.empty:
-            fornecedor_map = dict(zip(fornecedores["id"], fornecedores["nome"]))
-            aprovadas["fornecedor_nome"] = aprovadas["fornecedor_id"].map(fornecedor_map)
-        
-        # Cria label mais informativo com empresa, fornecedor, vencimento e valor
-        aprovadas["label"] = aprovadas.apply(lambda r: f'#{int(r["id"])} - {r.get("empresa","N/A")} | {r.get("fornecedor_nome","N/A")} | Venc: {r.get("vencimento","")} | {money(r.get("valor_previsto",0))}', axis=1)
-        escolha = st.selectbox("Conta a pagar", options=aprovadas["id"], format_func=lambda x: aprovadas.loc[aprovadas["id"]==x, "label"].values[0])
+        # Label informativo com empresa, fornecedor, vencimento e valor
+        escolha, conta_sel = seletor_conta(
+            "Conta a pagar", aprovadas,
+            [("", "empresa", "N/A"), ("", "fornecedor_nome", "N/A"), ("Venc: ", "vencimento", ""), ("", "valor_previsto", "")],
+            status=["aprovado", "provisionado"], select=colunas_contas, embed=("fornecedor", "categoria"),
+        )
         data_pag = st.date_input("Data do pagamento", value=datetime.today())
         valor_pago = st.text_input("Valor pago (ex: 1234,56) *")
         forma = st.selectbox("Forma de pagamento", ["TED", "PIX", "Boleto", "Cartão", "Dinheiro", "Outro"], index=1)
         if st.button("Registrar Pagamento"):
             vp = to_float(valor_pago)
-            if vp is None:
+            if escolha is None:
+                st.error("Selecione uma conta.")
+            elif vp is None:
                 st.error("Valor inválido.")
             else:
-                insert("pagamentos", {"conta_id": int(escolha), "data_pagamento": data_pag.strftime("%Y-%m-%d"), "valor_pago": vp, "forma_pagamento": forma})
-                upsert("contas", {"id": int(escolha), "status": "pago"})
-                st.success("Pagamento registrado e conta marcada como 'pago'.")
+                # Só marca como paga se a conta não mudou desde a leitura (concorrência otimista)
+                lido = conta_sel.get("atualizado_em") if "atualizado_em" in conta_sel.index else None
+                pagas = registrar_pagamentos([{
+                    "conta_id": int(escolha), "data_pagamento": data_pag.strftime("%Y-%m-%d"), "valor_pago": vp,
+                    "forma_pagamento": forma, "atualizado_em": lido if pd.notna(lido) else None,
+                }])
+                if pagas == []:
+                    st.warning("⚠️ A conta foi alterada por outro usuário desde que a página foi carregada. Recarregue e tente novamente.")
+                elif pagas:
+                    st.success("Pagamento registrado e conta marcada como 'pago'.")
     st.subheader("Importar Extrato (CSV)")
+    importacoes_extrato = painel_importacoes("extrato")
     up = st.file_uploader("Envie um CSV com colunas: data, historico, valor (negativo = saída)", type=["csv"])
-    if up is not None:
-        # Tenta diferentes codificações e delimitadores
-        df_csv = None
-        for encoding in ['utf-8', 'latin-1', 'cp1252']:
-            for sep in [';', ',', '\t']:  # Ponto e vírgula primeiro (formato brasileiro)
-                try:
-                    df_csv = pd.read_csv(up, encoding=encoding, sep=sep, header=0)
-                    if df_csv is not None and len(df_csv.columns) >= 3:  # Verifica se tem pelo menos 3 colunas
-                        st.info(f"✅ Arquivo lido com sucesso! Encoding: {encoding}, Delimitador: '{sep}', Colunas: {len(df_csv.columns)}")
-                        break  # Sai do loop de delimitadores se conseguir ler
-                except (UnicodeDecodeError, pd.errors.ParserError):
-                    continue  # Tenta a próxima combinação
-            if df_csv is not None:  # Se df foi lido com sucesso, sai do loop de encodings
-                break
-        if df_csv is None:  # Se não conseguiu ler com nenhuma combinação
-            st.error("Não foi possível ler o arquivo CSV com as codificações e delimitadores testados.")
+    impressao = impressao_arquivo(up) if up is not None else None
+    job = importacao_do_arquivo("extrato", impressao) if impressao else None
+    em_andamento = job is not None and job["status"] == "executando"
+    if em_andamento and impressao not in {j["impressao"] for j in importacoes_extrato}:
+        # Rodando em outro processo: mostra o último estado gravado no banco
+        mostra_importacao(job)
+        st.caption("Este arquivo já está sendo importado em outro servidor.")
+    elif em_andamento:
+        st.caption("Este arquivo já está sendo importado (acompanhe acima).")
+    iniciada = False
+    if up is not None and not em_andamento:
+        # Codificação e delimitador detectados no início do arquivo; leitura única (em blocos se for grande)
+        try:
+            blocos, encoding, sep = le_csv_blocos(up)
+            df_csv = next(blocos, None)
+        except (UnicodeDecodeError, pd.errors.ParserError, pd.errors.EmptyDataError):
+            df_csv = None
+        if df_csv is None or len(df_csv.columns) < 3:
+            st.error("Não foi possível ler o arquivo CSV: verifique se tem ao menos as colunas data, historico e valor.")
         else:
+            st.info(f"✅ Arquivo lido com sucesso! Encoding: {encoding}, Delimitador: {sep!r}, Colunas: {len(df_csv.columns)}")
             # Mapeia colunas com variações de nomes
             cols = {c.lower().strip(): c for c in df_csv.columns}
             col_mapping = {}
@@ -959,11 +2196,26 @@ elif page == "Pagamentos/Conciliação":
             
             if len(col_mapping) == 3:
                 try:
-                    df_csv_norm = pd.DataFrame({
-                        "data": pd.to_datetime(df_csv[col_mapping["data"]], errors="coerce", dayfirst=True).dt.date, 
-                        "historico": df_csv[col_mapping["historico"]].astype(str), 
-                        "valor": df_csv[col_mapping["valor"]].apply(to_float)
-                    }).dropna(subset=["data","valor"])
+                    rejeicoes = []
+
+                    def _normaliza_extrato(bloco):
+                        # Conversão vetorizada da coluna inteira; células inválidas saem com o motivo
+                        data, motivo_data = datas(bloco[col_mapping["data"]])
+                        cents, motivo_valor = valores_centavos(bloco[col_mapping["valor"]])
+                        rejeicoes.append(pd.concat([
+                            motivo_data.map({MOTIVO_VAZIO: "data vazia", MOTIVO_DATA_INVALIDA: "data inválida"}).dropna(),
+                            motivo_valor.map({MOTIVO_VAZIO: "valor vazio", MOTIVO_VALOR_INVALIDO: "valor inválido"}).dropna(),
+                        ]))
+                        return pd.DataFrame({
+                            "data": data.dt.date, 
+                            "historico": bloco[col_mapping["historico"]].astype(str), 
+                            "valor": cents.astype("float64") / 100
+                        }).dropna(subset=["data","valor"])
+                    # Blocos seguintes (arquivos grandes) são normalizados um a um
+                    df_csv_norm = pd.concat([_normaliza_extrato(df_csv)] + [_normaliza_extrato(b) for b in blocos], ignore_index=True)
+                    motivos_rejeicao = pd.concat(rejeicoes).value_counts()
+                    if not motivos_rejeicao.empty:
+                        st.warning("⚠️ Células rejeitadas: " + ", ".join(f"{m} ({n})" for m, n in motivos_rejeicao.items()))
                     
                     # Mostra estatísticas dos valores encontrados
                     st.info(f"📊 Estatísticas do arquivo: {len(df_csv_norm)} linhas processadas")
@@ -983,9 +2235,21 @@ elif page == "Pagamentos/Conciliação":
                     df_csv_norm = df_csv_norm[df_csv_norm["valor"] < 0]
                     
                     if not df_csv_norm.empty:
-                        for _, r in df_csv_norm.iterrows():
-                            insert("extrato", {"data": str(r["data"]), "historico": r["historico"], "valor": float(r["valor"])})
-                        st.success(f"✅ {len(df_csv_norm)} movimentações de saída importadas para 'extrato'.")
+                        if job is not None and impressao not in {j["impressao"] for j in importacoes_extrato}:
+                            mostra_importacao(job)
+                        acao = acao_importacao(job, "importacao_extrato")
+                        if acao:
+                            chunk_extrato = job["parametros"].get("chunk_size", IMPORT_CHUNK_SIZE) if acao == "retomar" else IMPORT_CHUNK_SIZE
+
+                            def _motor(checkpoint, on_lote, invalida, df=df_csv_norm, chunk_size=chunk_extrato):
+                                return importar_extrato_lote(df, chunk_size, on_lote=on_lote, checkpoint=checkpoint, invalida=invalida)
+
+                            iniciada = inicia_importacao(
+                                "extrato", up.name, impressao, _motor, parametros={"chunk_size": chunk_extrato},
+                                total=len(df_csv_norm), retomar=job if acao == "retomar" else None,
+                            ) is not None
+                            if not iniciada:
+                                st.warning("⚠️ Esta importação já foi retomada em outra sessão.")
                     else:
                         st.warning("⚠️ Nenhuma movimentação de saída encontrada no arquivo.")
                         st.info("💡 Dica: O sistema procura por valores negativos. Verifique se os valores de saída estão com sinal negativo.")
@@ -1001,10 +2265,12 @@ elif page == "Pagamentos/Conciliação":
                 if _str_to_bool(env_get('DEBUG')):
                     st.write("**Colunas disponíveis no arquivo:**", list(df_csv.columns))
                     st.write("**Tentativas de mapeamento:**", col_mapping)
+    if iniciada:
+        st.rerun()  # o painel passa a mostrar a importação recém-iniciada
     st.subheader("Conciliação automática (valor + data ±3 dias)")
     extrato = fetch_table("extrato", order="data")
     to_match = extrato.copy()
-    contas_df = fetch_table("contas")
+    contas_df = fetch_table("contas", select=colunas_contas, order="criado_em", embed=("fornecedor", "categoria"))
     
     # Sempre mostra os filtros, mesmo sem dados
     st.write("**Filtros para Conciliação:**")
@@ -1019,10 +2285,7 @@ elif page == "Pagamentos/Conciliação":
         col1.info("Nenhuma empresa encontrada")
     
     # Filtro por fornecedor
-    fornecedores = fetch_table("fornecedores")
-    if not fornecedores.empty:
-        fornecedor_map = dict(zip(fornecedores["id"], fornecedores["nome"]))
-        contas_df["fornecedor_nome"] = contas_df["fornecedor_id"].map(fornecedor_map)
+    if "fornecedor_nome" in contas_df.columns:
         fornecedores_disponiveis = contas_df["fornecedor_nome"].dropna().unique().tolist()
         if fornecedores_disponiveis:
             fornecedor_filtro = col2.selectbox("Filtrar por Fornecedor", ["Todos"] + fornecedores_disponiveis)
@@ -1034,6 +2297,12 @@ elif page == "Pagamentos/Conciliação":
         col2.info("Nenhum fornecedor encontrado")
     
     janela = st.slider("Janela de dias para casar data", 0, 10, 3)
+    modo_conc = st.radio(
+        "Modo de conciliação",
+        ["Um-para-um (ótimo global)", "Melhor candidato por movimento"],
+        index=0, horizontal=True,
+        help="Um-para-um garante que cada conta seja usada por no máximo uma movimentação."
+    )
     
     # Mostra informações sobre os critérios de conciliação
     st.info(f"🔍 **Critérios de Conciliação:**")
@@ -1054,74 +2323,27 @@ elif page == "Pagamentos/Conciliação":
             candidatos = candidatos[candidatos["fornecedor_nome"] == fornecedor_filtro]
 
         # Filtro por faixa de vencimento (contas)
-        try:
-            vseries_all = pd.to_datetime(candidatos["vencimento"], errors="coerce").dropna()
-            min_v = vseries_all.min().date() if not vseries_all.empty else datetime.today().date()
-            max_v = vseries_all.max().date() if not vseries_all.empty else datetime.today().date()
-        except Exception:
-            min_v = max_v = datetime.today().date()
+        vseries_all = candidatos["vencimento"].dropna() if "vencimento" in candidatos.columns else pd.Series(dtype="datetime64[ns]")
+        min_v = vseries_all.min().date() if not vseries_all.empty else datetime.today().date()
+        max_v = vseries_all.max().date() if not vseries_all.empty else datetime.today().date()
         colv1, colv2 = st.columns(2)
         conc_venc_ini = colv1.date_input("Vencimento de (contas)", value=min_v)
         conc_venc_fim = colv2.date_input("Vencimento até (contas)", value=max_v)
         if "vencimento" in candidatos.columns:
-            vseries_cand = pd.to_datetime(candidatos["vencimento"], errors="coerce").dt.date
-            candidatos = candidatos[(vseries_cand >= conc_venc_ini) & (vseries_cand <= conc_venc_fim)]
+            candidatos = candidatos[candidatos["vencimento"].between(pd.Timestamp(conc_venc_ini), pd.Timestamp(conc_venc_fim))]
         
         # Mostra quantas contas estão sendo consideradas
         st.info(f"🔍 Considerando {len(candidatos)} contas para conciliação (Empresa: {empresa_filtro}, Fornecedor: {fornecedor_filtro}, Venc: {conc_venc_ini} a {conc_venc_fim})")
         
-        for col in ["vencimento","competencia"]:
-            if col in candidatos.columns:
-                try: candidatos[col] = pd.to_datetime(candidatos[col]).dt.date
-                except: pass
-        if "valor_previsto" in candidatos.columns:
-            candidatos["valor_previsto"] = candidatos["valor_previsto"].astype(float)
-        
-        matches = []
-        for _, mov in to_match.iterrows():
-            val = float(mov.get("valor", 0))
-            if val >= 0: continue
-            alvo = abs(val)
-            
-            # Calcula diferenças de valor e data
-            candidatos["diff_valor"] = (candidatos["valor_previsto"] - alvo).abs()
-            candidatos["diff_data"] = candidatos["vencimento"].apply(lambda d: abs((pd.to_datetime(d) - pd.to_datetime(mov["data"])).days) if pd.notnull(d) else 9999)
-            
-            # Critérios mais flexíveis para conciliação
-            tolerancia_valor = 0.01  # 1 centavo de tolerância
-            tolerancia_data = janela + 2  # Janela + 2 dias extras
-            
-            # Filtra candidatos que atendem aos critérios
-            candidatos_validos = candidatos[
-                (candidatos["diff_valor"] <= tolerancia_valor) & 
-                (candidatos["diff_data"] <= tolerancia_data)
-            ].copy()
-            
-            if not candidatos_validos.empty:
-                # Ordena por proximidade de data primeiro, depois por valor
-                candidatos_validos = candidatos_validos.sort_values(["diff_data", "diff_valor"])
-                
-                # Pega o melhor candidato
-                melhor = candidatos_validos.iloc[0]
-                
-                matches.append({
-                    "extrato_id": mov["id"], 
-                    "extrato_data": mov["data"], 
-                    "extrato_hist": mov.get("historico",""), 
-                    "extrato_valor": val, 
-                    "conta_id": melhor["id"], 
-                    "conta_empresa": melhor.get("empresa", "N/A"),
-                    "conta_fornecedor": melhor.get("fornecedor_nome", "N/A"),
-                    "conta_desc": melhor.get("descricao",""), 
-                    "conta_venc": melhor.get("vencimento",""), 
-                    "conta_valor": melhor.get("valor_previsto",0.0), 
-                    "diff_valor": melhor["diff_valor"], 
-                    "diff_data": melhor["diff_data"]
-                })
+        # Datas e valores já chegam tipados (normaliza_tipos); o motor usa as colunas diretamente
+        # Motor vetorizado: mesmos critérios (R$ 0,01 e janela + 2 dias) sem laço por movimento
+        nao_conciliados = pd.DataFrame()
+        if modo_conc.startswith("Um-para-um"):
+            df_match, nao_conciliados = conciliar_um_para_um(to_match, candidatos, janela)
+        else:
+            df_match = conciliar(to_match, candidatos, janela)
         
-        if matches:
-            df_match = pd.DataFrame(matches)
-            
+        if not df_match.empty:
             # Mostra informações dos matches encontrados
             st.write(f"**📊 Encontrados {len(df_match)} possíveis conciliações:**")
             
@@ -1145,14 +2367,25 @@ elif page == "Pagamentos/Conciliação":
             
             if st.button("Confirmar conciliação para o melhor match por movimento"):
                 best = df_match.sort_values(["extrato_id","diff_valor","diff_data"]).drop_duplicates("extrato_id", keep="first")
-                count = 0
-                for _, row in best.iterrows():
-                    insert("pagamentos", {"conta_id": int(row["conta_id"]), "data_pagamento": str(row["extrato_data"]), "valor_pago": float(abs(row["extrato_valor"])), "forma_pagamento": "Extrato/Conciliação", "conciliado": True})
-                    upsert("contas", {"id": int(row["conta_id"]), "status": "pago"})
-                    count += 1
-                st.success(f"Conciliação registrada para {count} movimentações.")
+                # Uma transação para o lote; contas já pagas/canceladas por outro usuário são ignoradas
+                pagas = registrar_pagamentos([
+                    {"conta_id": int(row["conta_id"]), "data_pagamento": str(row["extrato_data"]),
+                     "valor_pago": float(abs(row["extrato_valor"])), "forma_pagamento": "Extrato/Conciliação", "conciliado": True}
+                    for _, row in best.iterrows()
+                ])
+                if pagas is not None:
+                    st.success(f"Conciliação registrada para {len(pagas)} movimentações.")
+                    if len(best) > len(pagas):
+                        st.warning(f"⚠️ {len(best) - len(pagas)} conta(s) já não estavam em aberto e foram ignoradas.")
         else:
             st.info("Nenhum candidato para conciliação automática no momento com os filtros aplicados.")
+        
+        if not nao_conciliados.empty:
+            with st.expander(f"⚠️ {len(nao_conciliados)} movimentação(ões) de saída sem conciliação"):
+                df_nc = nao_conciliados.copy()
+                df_nc["extrato_valor"] = df_nc["extrato_valor"].apply(lambda x: money(abs(x)))
+                df_nc.columns = ["ID Extrato", "Data Extrato", "Histórico", "Valor Extrato", "Contas compatíveis", "Motivo"]
+                st.dataframe(df_nc, use_container_width=True)
     else:
         st.info("Importe um extrato para conciliar.")
     
@@ -1162,17 +2395,19 @@ elif page == "Pagamentos/Conciliação":
     st.write("**🔍 Exclusão Individual:**")
     
     # Busca contas para exclusão
-    todas_contas = fetch_table("contas", order="criado_em")
+    todas_contas = fetch_table("contas", select=colunas_contas, order="criado_em", embed=("fornecedor", "categoria"))
     if not todas_contas.empty:
         # Mostra apenas contas pagas ou aprovadas
         contas_excluir = todas_contas[todas_contas["status"].isin(["pago", "aprovado"])].copy()
         
         if not contas_excluir.empty:
-            contas_excluir["label"] = contas_excluir.apply(lambda r: f'#{int(r["id"])} - {r.get("descricao","")} / Venc.: {r.get("vencimento","")} / Prev.: {money(r.get("valor_previsto",0))} / Status: {r.get("status","")}', axis=1)
-            
             col1, col2 = st.columns([3, 1])
             with col1:
-                conta_excluir = st.selectbox("Selecione a conta para excluir", options=contas_excluir["id"], format_func=lambda x: contas_excluir.loc[contas_excluir["id"]==x, "label"].values[0])
+                conta_excluir, conta_detalhes = seletor_conta(
+                    "Selecione a conta para excluir", contas_excluir,
+                    [("", "descricao", ""), ("Venc.: ", "vencimento", ""), ("Prev.: ", "valor_previsto", ""), ("Status: ", "status", "")],
+                    sep=" / ", status=["pago", "aprovado"], select=colunas_contas, embed=("fornecedor", "categoria"),
+                )
             
             with col2:
                 st.write("")  # Espaçamento
@@ -1181,11 +2416,13 @@ elif page == "Pagamentos/Conciliação":
                     if conta_excluir:
                         # Confirmação adicional
                         if st.session_state.get('confirm_delete', False):
-                            result = delete_conta(int(conta_excluir))
-                            if result:
+                            result = delete_contas([conta_excluir])[int(conta_excluir)]
+                            if result == "excluída":
                                 st.success(f"Conta #{conta_excluir} excluída com sucesso!")
                                 st.session_state['confirm_delete'] = False
                                 st.rerun()
+                            else:
+                                st.error(f"Conta #{conta_excluir} não excluída ({result}).")
                         else:
                             st.session_state['confirm_delete'] = True
                             st.warning("⚠️ Clique novamente para confirmar a exclusão!")
@@ -1194,8 +2431,6 @@ elif page == "Pagamentos/Conciliação":
             
             # Mostra detalhes da conta selecionada
             if conta_excluir:
-                conta_detalhes = contas_excluir[contas_excluir["id"] == conta_excluir].iloc[0]
-                
                 st.write("**Detalhes da Conta Selecionada:**")
                 col1, col2, col3 = st.columns(3)
                 with col1:
@@ -1203,20 +2438,21 @@ elif page == "Pagamentos/Conciliação":
                     st.write(f"**Status:** {conta_detalhes['status']}")
                     st.write(f"**Valor:** {money(conta_detalhes['valor_previsto'])}")
                 with col2:
-                    st.write(f"**Vencimento:** {conta_detalhes['vencimento']}")
-                    st.write(f"**Competência:** {conta_detalhes['competencia']}")
+                    st.write(f"**Vencimento:** {conta_detalhes['vencimento'].date() if pd.notna(conta_detalhes['vencimento']) else 'N/A'}")
+                    st.write(f"**Competência:** {conta_detalhes['competencia'].date() if pd.notna(conta_detalhes['competencia']) else 'N/A'}")
                     st.write(f"**Descrição:** {conta_detalhes.get('descricao', 'N/A')}")
                 with col3:
-                    # Busca fornecedor e categoria
-                    fornecedor = fetch_table("fornecedores", eq={"id": conta_detalhes['fornecedor_id']})
-                    categoria = fetch_table("categorias", eq={"id": conta_detalhes['categoria_id']})
-                    st.write(f"**Fornecedor:** {fornecedor.iloc[0]['nome'] if not fornecedor.empty else 'N/A'}")
-                    st.write(f"**Categoria:** {categoria.iloc[0]['nome'] if not categoria.empty else 'N/A'}")
+                    # Fornecedor e categoria já vêm embutidos na consulta de contas
+                    fornecedor_nome = conta_detalhes.get("fornecedor_nome")
+                    categoria_nome = conta_detalhes.get("categoria_nome")
+                    st.write(f"**Fornecedor:** {fornecedor_nome if pd.notna(fornecedor_nome) else 'N/A'}")
+                    st.write(f"**Categoria:** {categoria_nome if pd.notna(categoria_nome) else 'N/A'}")
                 
                 # Mostra pagamentos relacionados
                 pagamentos_conta = fetch_table("pagamentos", eq={"conta_id": conta_excluir})
                 if not pagamentos_conta.empty:
                     st.write("**Pagamentos Relacionados:**")
+                    pagamentos_conta["data_pagamento"] = datas_texto(pagamentos_conta["data_pagamento"])
                     for _, pag in pagamentos_conta.iterrows():
                         st.write(f"- {pag['data_pagamento']} | {money(pag['valor_pago'])} | {pag['forma_pagamento']}")
                 
@@ -1224,6 +2460,7 @@ elif page == "Pagamentos/Conciliação":
                 aprovacoes_conta = fetch_table("aprovacoes", eq={"conta_id": conta_excluir})
                 if not aprovacoes_conta.empty:
                     st.write("**Aprovações Relacionadas:**")
+                    aprovacoes_conta["data_aprovacao"] = datas_texto(aprovacoes_conta["data_aprovacao"])
                     for _, apr in aprovacoes_conta.iterrows():
                         st.write(f"- {apr['data_aprovacao']} | Aprovado por: {apr['aprovado_por']}")
                         if apr.get('observacao'):
@@ -1232,14 +2469,13 @@ elif page == "Pagamentos/Conciliação":
             st.info("Não há contas pagas ou aprovadas para excluir.")
     else:
         st.info("Não há contas cadastradas.")
+    aguarda_importacoes(importacoes_extrato)
 
 elif page == "Dashboard":
     st.title("📊 Dashboard Executivo")
     st.markdown("---")
     
-    contas = fetch_table("contas")
-    pagamentos = fetch_table("pagamentos")
-    categorias = fetch_table("categorias")
+    contas = fetch_table("contas", select=projecao("contas", COLUNAS_PAGINA["Dashboard"]), embed=("categoria",))
     
     # Filtro por empresa (Dashboard)
     if not contas.empty and "empresa" in contas.columns:
@@ -1249,9 +2485,7 @@ elif page == "Dashboard":
             contas = contas[contas["empresa"] == empresa_dash]
 
     # Filtro por Categoria do Título
-    if not contas.empty and "categoria_id" in contas.columns and not categorias.empty:
-        cat_map_dash = dict(zip(categorias["id"], categorias["nome"]))
-        contas["categoria_nome"] = contas["categoria_id"].map(cat_map_dash)
+    if not contas.empty and "categoria_nome" in contas.columns:
         cats_opts = ["Todas"] + sorted([c for c in contas["categoria_nome"].dropna().unique().tolist() if str(c).strip()])
         cat_dash = st.selectbox("Filtrar por Categoria do Título", options=cats_opts, index=0)
         if cat_dash != "Todas":
@@ -1262,7 +2496,7 @@ elif page == "Dashboard":
     hoje_norm = pd.Timestamp.today().normalize().date()
     # Defaults baseados nos dados filtrados por empresa
     if not contas.empty and "vencimento" in contas.columns:
-        venc_series_all = pd.to_datetime(contas["vencimento"], errors="coerce").dropna()
+        venc_series_all = contas["vencimento"].dropna()
         if not venc_series_all.empty:
             periodo_ini_default = venc_series_all.min().date()
             periodo_fim_default = venc_series_all.max().date()
@@ -1278,8 +2512,7 @@ elif page == "Dashboard":
 
     # Aplica filtro de período às contas
     if not contas.empty and "vencimento" in contas.columns:
-        v_series = pd.to_datetime(contas["vencimento"], errors="coerce").dt.date
-        contas = contas[(v_series >= periodo_ini) & (v_series <= periodo_fim)]
+        contas = contas[contas["vencimento"].between(pd.Timestamp(periodo_ini), pd.Timestamp(periodo_fim))]
     
     # Hoje para métricas auxiliares
     hoje = pd.Timestamp.today().normalize()
@@ -1287,9 +2520,8 @@ elif page == "Dashboard":
     if contas.empty:
         st.info("📭 Nenhuma conta encontrada.")
     else:
-        contas["vencimento"] = pd.to_datetime(contas["vencimento"], errors="coerce")
-        contas["competencia"] = pd.to_datetime(contas["competencia"], errors="coerce")
-        contas["valor_previsto"] = pd.to_numeric(contas["valor_previsto"], errors="coerce").fillna(0.0)
+        # Datas já vêm como datetime64 e valores como float64 (normaliza_tipos)
+        contas["valor_previsto"] = contas["valor_previsto"].fillna(0.0)
         
         total_previsto = contas["valor_previsto"].sum()
         contas_pagas = contas[contas["status"] == "pago"]
@@ -1347,7 +2579,7 @@ elif page == "Dashboard":
         
         with col_graf1:
             st.markdown("### 📊 Status das Contas")
-            status_counts = contas["status"].value_counts()
+            status_counts = contas["status"].value_counts()[lambda c: c > 0]
             
             # Cores personalizadas para cada status
             cores_status = {
@@ -1411,8 +2643,8 @@ elif page == "Dashboard":
         
         if not recorte.empty:
             s2 = recorte.groupby("categoria_id")["valor_previsto"].sum().sort_values(ascending=True)
-            if not categorias.empty:
-                cat_map = dict(zip(categorias["id"], categorias["nome"]))
+            if recorte["categoria_nome"].notna().any():
+                cat_map = recorte.dropna(subset=["categoria_nome"]).drop_duplicates("categoria_id").set_index("categoria_id")["categoria_nome"].to_dict()
                 s2.index = s2.index.map(lambda i: cat_map.get(i, f"Cat {i}"))
                 
                 fig3, ax3 = plt.subplots(figsize=(10, 6))
@@ -1549,53 +2781,40 @@ elif page == "ETL/Importação":
     st.write("**Formato mínimo:** fornecedor, categoria, descricao, vencimento (AAAA-MM-DD), valor_previsto")
     st.write("**Campos opcionais:** empresa, cnpj, numero_documento")
     st.info("💡 **Dica:** A competência será calculada automaticamente como o primeiro dia do mês de vencimento.")
+    chunk_size = st.number_input(
+        "Tamanho do lote (linhas por insert)",
+        min_value=1, max_value=5000,
+        value=int(env_get("IMPORT_CHUNK_SIZE") or IMPORT_CHUNK_SIZE), step=100
+    )
+    # A importação roda em segundo plano: recarregar a página ou mexer nos widgets não a interrompe
+    importacoes_contas = painel_importacoes("contas")
     up = st.file_uploader("Envie XLSX ou CSV", type=["xlsx","csv"])
-    if up is not None:
+    impressao = impressao_arquivo(up) if up is not None else None
+    job = importacao_do_arquivo("contas", impressao) if impressao else None
+    em_andamento = job is not None and job["status"] == "executando"
+    if em_andamento and impressao not in {j["impressao"] for j in importacoes_contas}:
+        # Rodando em outro processo: mostra o último estado gravado no banco
+        mostra_importacao(job)
+        st.caption("Este arquivo já está sendo importado em outro servidor.")
+    elif em_andamento:
+        st.caption("Este arquivo já está sendo importado (acompanhe acima).")
+    iniciada = False
+    if up is not None and not em_andamento:
         try:
-            import pandas as pd
-            if up.name.lower().endswith(".xlsx"): 
-                df = pd.read_excel(up)
-            else: 
-                # Tenta diferentes codificações e delimitadores
-                df = None
-                used_encoding = None
-                used_sep = None
-                
-                # Primeiro tenta com ponto e vírgula (mais comum em CSVs brasileiros)
-                for encoding in ['utf-8', 'latin-1', 'cp1252']:
-                    for sep in [';', ',', '\t']:
-                        try:
-                            # Reset do ponteiro do arquivo para cada tentativa
-                            up.seek(0)
-                            
-                            # Tenta ler o CSV
-                            temp_df = pd.read_csv(up, encoding=encoding, sep=sep, header=0)
-                            
-                            # Verifica se conseguiu separar em múltiplas colunas
-                            if len(temp_df.columns) >= 3:  # Pelo menos 3 colunas
-                                # Verifica se as colunas fazem sentido
-                                if not any("Sem nome" in str(col) or "Unnamed" in str(col) for col in temp_df.columns):
-                                    df = temp_df
-                                    used_encoding = encoding
-                                    used_sep = sep
-                                    break
-                        except (UnicodeDecodeError, pd.errors.ParserError, Exception):
-                            continue  # Tenta a próxima combinação
-                    if df is not None:  # Se df foi lido com sucesso, sai do loop de encodings
-                        break
-                if df is None:  # Se não conseguiu ler com nenhuma combinação
-                    raise Exception("Não foi possível ler o arquivo CSV com as codificações e delimitadores testados.")
-                
-                # Mostra informações sobre a leitura
-                st.info(f"✅ Arquivo lido com sucesso! Codificação: {used_encoding}, Delimitador: '{used_sep}'")
-                
-                # Debug opcional
-                if _str_to_bool(env_get('DEBUG')):
-                    st.write("**Primeiras 3 linhas do arquivo:**")
-                    st.write(df.head(3))
-                    st.write(f"**Debug - Shape do DataFrame:** {df.shape}")
-                    st.write(f"**Debug - Colunas detectadas:** {list(df.columns)}")
-                    st.write(f"**Debug - Tipos de dados:** {df.dtypes.to_dict()}")
+            # Leitura em fluxo: só o primeiro bloco é lido agora (para mapear as colunas)
+            blocos, formato = le_planilha_blocos(up, up.name)
+            df = next(blocos, None)
+            if df is None:
+                raise Exception("Arquivo sem linhas de dados.")
+            st.info(f"✅ Arquivo aberto com sucesso! {formato}")
+            
+            # Debug opcional
+            if _str_to_bool(env_get('DEBUG')):
+                st.write("**Primeiras 3 linhas do arquivo:**")
+                st.write(df.head(3))
+                st.write(f"**Debug - Linhas no primeiro bloco:** {len(df)}")
+                st.write(f"**Debug - Colunas detectadas:** {list(df.columns)}")
+                st.write(f"**Debug - Tipos de dados:** {df.dtypes.to_dict()}")
                 
             req = ["fornecedor","categoria","descricao","vencimento","valor_previsto"]
             opt = ["empresa","cnpj","numero_documento"]
@@ -1676,58 +2895,70 @@ elif page == "ETL/Importação":
                     st.write("**Colunas disponíveis no arquivo:**", list(df.columns))
                     st.write("**Colunas normalizadas:**", list(normalized_cols.keys()))
             else:
-                inserted = 0
-                for _, r in df.iterrows():
-                    # Busca CNPJ se disponível
-                    cnpj_val = str(r[col_mapping["cnpj"]]) if "cnpj" in col_mapping and pd.notna(r[col_mapping["cnpj"]]) else None
-                    fornecedor_id = ensure_fornecedor(str(r[col_mapping["fornecedor"]]), cnpj=cnpj_val)
-                    categoria_id = ensure_categoria(str(r[col_mapping["categoria"]]))
-                    
-                    # Prepara dados da conta
-                    vencimento_date = pd.to_datetime(r[col_mapping["vencimento"]], errors="coerce", dayfirst=True).date()
-                    # Usa a data de vencimento como competência (primeiro dia do mês)
-                    competencia_date = vencimento_date.replace(day=1) if vencimento_date else None
-                    
-                    # Limpa o valor monetário (formato brasileiro)
-                    valor_str = str(r[col_mapping["valor_previsto"]])
-                    # Remove R$, espaços e caracteres especiais
-                    valor_limpo = valor_str.replace("R$", "").replace(" ", "").strip()
-                    
-                    # Trata formato brasileiro: 1.234,56 -> 1234.56
-                    if '.' in valor_limpo and ',' in valor_limpo:
-                        # Formato: 1.234,56 (ponto como milhares, vírgula como decimal)
-                        valor_limpo = valor_limpo.replace(".", "").replace(",", ".")
-                    elif ',' in valor_limpo:
-                        # Formato: 1234,56 (apenas vírgula como decimal)
-                        valor_limpo = valor_limpo.replace(",", ".")
-                    
-                    try:
-                        valor_float = float(valor_limpo)
-                    except ValueError:
-                        st.error(f"Erro ao converter valor: '{valor_str}' -> '{valor_limpo}'")
-                        continue
-                    
-                    conta_data = {
-                        "fornecedor_id": fornecedor_id, 
-                        "categoria_id": categoria_id, 
-                        "descricao": str(r[col_mapping["descricao"]]), 
-                        "competencia": str(competencia_date), 
-                        "vencimento": str(vencimento_date), 
-                        "valor_previsto": valor_float, 
-                        "status": "provisionado"
-                    }
-                    
-                    # Adiciona campos opcionais se disponíveis
-                    if "empresa" in col_mapping and pd.notna(r[col_mapping["empresa"]]):
-                        conta_data["empresa"] = str(r[col_mapping["empresa"]])
-                    if "numero_documento" in col_mapping and pd.notna(r[col_mapping["numero_documento"]]):
-                        conta_data["numero_documento"] = str(r[col_mapping["numero_documento"]])
-                    
-                    insert("contas", conta_data)
-                    inserted += 1
-                st.success(f"Importação concluída: {inserted} linhas inseridas.")
+                if job is not None and impressao not in {j["impressao"] for j in importacoes_contas}:
+                    mostra_importacao(job)
+                acao = acao_importacao(job, "importacao_contas")
+                if acao == "retomar":
+                    # Mesmo mapeamento e lote da execução interrompida: os lotes do checkpoint batem
+                    col_mapping, chunk_size = job["parametros"]["col_mapping"], job["parametros"]["chunk_size"]
+                if acao:
+                    def _motor(checkpoint, on_lote, invalida, dados=up.getvalue(), nome=up.name,
+                               col_mapping=col_mapping, chunk_size=int(chunk_size)):
+                        arquivo = io.BytesIO(dados)
+                        blocos, _ = le_planilha_blocos(arquivo, nome)
+
+                        def _on_lote(parcial):
+                            # Total de linhas é desconhecido em fluxo: o avanço do CSV é medido pelos bytes lidos
+                            if not nome.lower().endswith(".xlsx"):
+                                parcial = {**parcial, "progresso": min(arquivo.tell() / max(len(dados), 1), 1.0)}
+                            on_lote(parcial)
+
+                        return importar_contas_blocos(
+                            blocos, col_mapping, chunk_size=chunk_size, on_lote=_on_lote, checkpoint=checkpoint,
+                            indice=_carrega_indice_resolucao(), invalida=invalida,
+                        )
+
+                    iniciada = inicia_importacao(
+                        "contas", up.name, impressao, _motor,
+                        parametros={"col_mapping": col_mapping, "chunk_size": int(chunk_size)},
+                        retomar=job if acao == "retomar" else None,
+                    ) is not None
+                    if not iniciada:
+                        st.warning("⚠️ Esta importação já foi retomada em outra sessão.")
         except Exception as e:
             st.exception(e)
-
-            
-
+    if iniciada:
+        st.rerun()  # o painel passa a mostrar a importação recém-iniciada
+    aguarda_importacoes(importacoes_contas)
+
+# Métricas do cache de leituras (apenas em DEBUG)
+if _str_to_bool(env_get('DEBUG')):
+    with st.sidebar.expander("📦 Cache de dados"):
+        stats = cache_stats()
+        hits = sum(v["hits"] + v["memo"] for v in stats.values())
+        misses = sum(v["misses"] for v in stats.values())
+        st.caption(f"{hits} acertos / {misses} faltas — {hits} consultas economizadas")
+        if stats:
+            st.dataframe(pd.DataFrame(stats).T, use_container_width=True)
+        reps = replicas_residentes()
+        if reps:
+            st.caption("Réplicas sincronizadas por delta (linhas na réplica / recebidas na última sincronização):")
+            st.dataframe(
+                pd.DataFrame([{"tabela": k[0], "consulta": k[2], "linhas": len(r["df"]), "última sincronização": r["linhas"]} for k, r in reps.items()]),
+                use_container_width=True
+            )
+        residente = cache_residente()
+        if residente:
+            st.caption(f"Memória do cache compartilhado: {sum(residente.values()) / 1024 / 1024:.1f} de {CACHE_MAX_MB:.0f} MB")
+            st.dataframe(
+                pd.DataFrame({"MB": {t: n / 1024 / 1024 for t, n in residente.items()}}).round(2),
+                use_container_width=True
+            )
+        repetidas = consultas_repetidas()
+        if repetidas:
+            st.caption(f"Consultas repetidas nesta execução ({page}): {sum(n - 1 for n in repetidas.values())}")
+            st.dataframe(
+                pd.DataFrame([{"tabela": k[0], "consulta": repr(k[1:]), "vezes": n} for k, n in repetidas.items()]),
+                use_container_width=True
+            )
+            logger.debug("Página %s: %d consulta(s) repetida(s): %s", page, len(repetidas), repetidas)
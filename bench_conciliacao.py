@@ -0,0 +1,202 @@
+"""Benchmark da conciliação automática: laço original × motor vetorizado.
+
+Também mede o modo um-para-um (`conciliar_um_para_um`).
+
+Uso:
+    python bench_conciliacao.py [--tamanhos 1000 10000 100000] [--max-laco 50] [--repetidos 2000 6000]
+
+O laço original é O(N×M); acima de `--max-laco` movimentos ele é medido numa
+amostra e o tempo é extrapolado linearmente (marcado com "~"). "iguais" confere
+a saída completa do motor vetorizado com `conciliar_referencia` (mesmos
+critérios do laço, contas indexadas por centavos) e a referência com o laço na
+amostra. "1:1 ok" confere que o modo um-para-um usa cada conta uma vez, respeita
+os critérios e atinge o máximo de pares (fluxo máximo calculado à parte).
+`--repetidos` acrescenta casos em que todas as linhas têm o mesmo valor.
+"""
+import argparse
+import time
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import maximum_flow
+
+from conciliacao import conciliar, conciliar_um_para_um
+
+
+def conciliar_laco(to_match, candidatos, janela):
+    """Reprodução fiel do laço `iterrows()` usado antes na página de conciliação."""
+    candidatos = candidatos.copy()
+    matches = []
+    for _, mov in to_match.iterrows():
+        val = float(mov.get("valor", 0))
+        if val >= 0: continue
+        alvo = abs(val)
+        candidatos["diff_valor"] = (candidatos["valor_previsto"] - alvo).abs()
+        candidatos["diff_data"] = candidatos["vencimento"].apply(lambda d: abs((pd.to_datetime(d) - pd.to_datetime(mov["data"])).days) if pd.notnull(d) else 9999)
+        candidatos_validos = candidatos[
+            (candidatos["diff_valor"] <= 0.01) &
+            (candidatos["diff_data"] <= janela + 2)
+        ].copy()
+        if not candidatos_validos.empty:
+            melhor = candidatos_validos.sort_values(["diff_data", "diff_valor"]).iloc[0]
+            matches.append({"extrato_id": mov["id"], "conta_id": melhor["id"],
+                            "diff_valor": melhor["diff_valor"], "diff_data": melhor["diff_data"]})
+    return pd.DataFrame(matches, columns=["extrato_id", "conta_id", "diff_valor", "diff_data"])
+
+
+def conciliar_referencia(to_match, candidatos, janela):
+    """Mesmos critérios e desempates do laço, com as contas indexadas por centavos."""
+    valores = candidatos["valor_previsto"].to_numpy(dtype=np.float64)
+    venc = pd.to_datetime(candidatos["vencimento"])
+    dias = venc.to_numpy(dtype="datetime64[D]").astype(np.int64)
+    por_centavo = defaultdict(list)
+    for pos in np.flatnonzero(venc.notna().to_numpy() & ~np.isnan(valores)):
+        por_centavo[round(valores[pos] * 100)].append(pos)
+    ids = candidatos["id"].to_numpy()
+    dias_mov = pd.to_datetime(to_match["data"]).to_numpy(dtype="datetime64[D]").astype(np.int64)
+    matches = []
+    for mov_id, val, dia in zip(to_match["id"], to_match["valor"].astype(float), dias_mov):
+        if not val < 0:
+            continue
+        alvo = -val
+        melhor = None
+        for cent in range(round(alvo * 100) - 2, round(alvo * 100) + 3):
+            for pos in por_centavo.get(cent, ()):
+                dv, dd = abs(valores[pos] - alvo), abs(int(dias[pos] - dia))
+                if dv <= 0.01 and dd <= janela + 2 and (melhor is None or (dd, dv, pos) < melhor):
+                    melhor = (dd, dv, pos)
+        if melhor is not None:
+            matches.append({"extrato_id": mov_id, "conta_id": ids[melhor[2]],
+                            "diff_valor": melhor[1], "diff_data": melhor[0]})
+    return pd.DataFrame(matches, columns=["extrato_id", "conta_id", "diff_valor", "diff_data"])
+
+
+def maximo_de_pares(extrato, contas, janela):
+    """Máximo de pares um-para-um: fluxo máximo entre grupos (valor, dia)."""
+    def grupos(valores, datas):
+        df = pd.DataFrame({"valor": np.abs(valores),
+                           "dia": pd.to_datetime(datas).to_numpy(dtype="datetime64[D]").astype(np.int64)})
+        df = df.groupby(["valor", "dia"]).size().rename("n").reset_index()
+        df["cents"] = np.round(df["valor"] * 100).astype(np.int64)
+        return df
+
+    saidas = extrato[extrato["valor"] < 0]
+    ge, gc = grupos(saidas["valor"], saidas["data"]), grupos(contas["valor_previsto"], contas["vencimento"])
+    ge["e"], gc["c"] = np.arange(len(ge)), np.arange(len(gc))
+    deslocs = pd.MultiIndex.from_product([range(-2, 3), range(-janela - 2, janela + 3)], names=["dc", "dd"]).to_frame(index=False)
+    alvos = ge.merge(deslocs, how="cross")
+    alvos["cents"] += alvos["dc"]
+    alvos["dia"] += alvos["dd"]
+    arestas = alvos[["e", "valor", "cents", "dia"]].merge(gc, on=["cents", "dia"], suffixes=("", "_c"))
+    # Mesmo critério de valor do laço, em ponto flutuante
+    arestas = arestas[(arestas["valor_c"] - arestas["valor"]).abs() <= 0.01]
+    # nós: 0 = origem, 1..E movimentos, E+1..E+C contas, E+C+1 = destino
+    ne, nc = len(ge), len(gc)
+    destino = ne + nc + 1
+    origem_ = np.r_[np.zeros(ne), 1 + arestas["e"], 1 + ne + gc["c"]].astype(np.int64)
+    fim = np.r_[1 + ge["e"], 1 + ne + arestas["c"], np.full(nc, destino)].astype(np.int64)
+    capacidade = np.r_[ge["n"], np.full(len(arestas), len(extrato)), gc["n"]].astype(np.int32)
+    grafo = csr_matrix((capacidade, (origem_, fim)), shape=(destino + 1, destino + 1))
+    return maximum_flow(grafo, 0, destino).flow_value
+
+
+def confere_um_para_um(resultado, extrato, contas, janela):
+    return bool(
+        resultado["conta_id"].is_unique and resultado["extrato_id"].is_unique
+        and (resultado["diff_valor"] <= 0.01).all() and (resultado["diff_data"] <= janela + 2).all()
+        and len(resultado) == maximo_de_pares(extrato, contas, janela)
+    )
+
+
+def gera_dados(n_extrato, n_contas, seed=42):
+    rng = np.random.default_rng(seed)
+    inicio = np.datetime64("2024-01-01")
+    # Faixa estreita de valores para forçar empates e colisões de valor
+    centavos = rng.integers(100, 50000, n_contas)
+    contas = pd.DataFrame({
+        "id": np.arange(1, n_contas + 1),
+        "vencimento": pd.Series(inicio + rng.integers(0, 365, n_contas)).dt.date,
+        "valor_previsto": centavos / 100,
+        "empresa": rng.choice(["Matriz", "Filial"], n_contas),
+        "descricao": "conta",
+    })
+    escolhidas = rng.integers(0, n_contas, n_extrato)
+    extrato = pd.DataFrame({
+        "id": np.arange(1, n_extrato + 1),
+        "data": (pd.to_datetime(contas["vencimento"].to_numpy()[escolhidas])
+                 + pd.to_timedelta(rng.integers(-6, 7, n_extrato), unit="D")).strftime("%Y-%m-%d"),
+        "historico": "PAGAMENTO",
+        "valor": -(contas["valor_previsto"].to_numpy()[escolhidas] + rng.choice([0, 0, 0.01, 0.5], n_extrato)),
+    })
+    return extrato, contas
+
+
+def _cronometra(fn, *args):
+    t0 = time.perf_counter()
+    out = fn(*args)
+    return out, time.perf_counter() - t0
+
+
+def gera_repetidos(n, seed=42):
+    """Todas as contas e saídas com o mesmo valor, vencimentos espalhados em 30 dias."""
+    rng = np.random.default_rng(seed)
+    inicio = np.datetime64("2024-01-01")
+    contas = pd.DataFrame({
+        "id": np.arange(1, n + 1),
+        "vencimento": pd.Series(inicio + rng.integers(0, 30, n)).dt.date,
+        "valor_previsto": 150.0,
+        "empresa": "Matriz",
+        "descricao": "aluguel",
+    })
+    extrato = pd.DataFrame({
+        "id": np.arange(1, n + 1),
+        "data": pd.Series(inicio + rng.integers(0, 30, n)).dt.strftime("%Y-%m-%d"),
+        "historico": "PAGAMENTO",
+        "valor": -150.0,
+    })
+    return extrato, contas
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--tamanhos", type=int, nargs="+", default=[1000, 10000, 100000])
+    ap.add_argument("--repetidos", type=int, nargs="*", default=[2000, 6000])
+    ap.add_argument("--max-laco", type=int, default=50)
+    ap.add_argument("--janela", type=int, default=3)
+    args = ap.parse_args()
+
+    cols = ["extrato_id", "conta_id", "diff_data"]
+
+    def mesmos(a, b):
+        return a[cols].reset_index(drop=True).astype("int64").equals(b[cols].reset_index(drop=True).astype("int64"))
+
+    print(f"{'dados':>9} {'extrato':>8} {'contas':>8} {'laço (s)':>12} {'vetorizado (s)':>15} {'ganho':>8} "
+          f"{'iguais':>7} {'1:1 (s)':>8} {'1:1 ok':>7}")
+    casos = [("aleatório", n, gera_dados(n, n)) for n in args.tamanhos]
+    casos += [("repetidos", n, gera_repetidos(n)) for n in args.repetidos]
+    for nome, n, (extrato, contas) in casos:
+        novo, t_novo = _cronometra(conciliar, extrato, contas, args.janela)
+        (um_para_um, _), t_1p1 = _cronometra(conciliar_um_para_um, extrato, contas, args.janela)
+
+        amostra = extrato.iloc[:min(n, args.max_laco)]
+        antigo, t_laco = _cronometra(conciliar_laco, amostra, contas, args.janela)
+        estimado = len(amostra) < n
+        if estimado:
+            t_laco *= n / len(amostra)
+
+        referencia = conciliar_referencia(extrato, contas, args.janela)
+        iguais = (
+            mesmos(novo, referencia)
+            and mesmos(referencia[referencia["extrato_id"].isin(amostra["id"])], antigo)
+        )
+        ok = confere_um_para_um(um_para_um, extrato, contas, args.janela)
+        laco_txt = f"{'~' if estimado else ''}{t_laco:.2f}"
+        print(f"{nome:>9} {n:>8} {len(contas):>8} {laco_txt:>12} {t_novo:>15.3f} {t_laco / t_novo:>7.0f}x "
+              f"{str(iguais):>7} {t_1p1:>8.3f} {str(ok):>7}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""Benchmark da conversão de valores e datas: funções por célula × colunas vetorizadas.
+
+Uso:
+    python bench_importacao.py [--tamanhos 10000 100000 1000000] [--distintos 1.0 0.05]
+
+Compara `to_float` / `_parse_valor_planilha` (aplicadas com `.apply`) e o
+`pd.to_datetime(dayfirst=True)` antigo com `valores_centavos` e `datas` do
+módulo `importacao`. `--distintos` é a fração de valores distintos na coluna
+(extratos e planilhas reais repetem muitos valores e quase todas as datas).
+
+"iguais" confere `valores_centavos` com `_parse_valor_planilha` nas células
+que os dois aceitam (o antigo não entende parênteses) e as datas dd/mm/aaaa
+que o `to_datetime` antigo converteu (ele infere o formato da primeira célula:
+descarta as demais ou, se ela for ISO, troca dia e mês nas ISO seguintes).
+"to_float ≠" conta as células em que o `to_float` antigo devolvia outro
+valor, em geral 0,0 para textos com "R$".
+"""
+import argparse
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from importacao import datas, valores_centavos
+
+
+def to_float(x):
+    """Reprodução fiel do `to_float` usado antes no import de extrato."""
+    try:
+        s = str(x).strip()
+        if not s:
+            return 0.0
+        is_negative = s.startswith('-')
+        if is_negative:
+            s = s[1:]
+        if '.' in s and ',' in s:
+            s = s.replace(".", "").replace(",", ".")
+        elif ',' in s:
+            s = s.replace(",", ".")
+        result = float(s)
+        return -result if is_negative else result
+    except:
+        return 0.0
+
+
+def _parse_valor_planilha(v):
+    """Reprodução fiel do conversor usado antes no ETL de contas."""
+    if v is None or (not isinstance(v, str) and pd.isna(v)):
+        return None
+    s = str(v).replace("R$", "").replace(" ", "").strip()
+    if '.' in s and ',' in s:
+        s = s.replace(".", "").replace(",", ".")
+    elif ',' in s:
+        s = s.replace(",", ".")
+    try:
+        return float(s)
+    except ValueError:
+        return None
+
+
+def gera_dados(n, distintos=1.0, seed=42):
+    rng = np.random.default_rng(seed)
+    k = max(1, int(n * distintos))
+    centavos = rng.integers(-10_000_000, 10_000_000, k)
+    reais = (np.abs(centavos) // 100).astype(str)
+    resto = np.char.zfill((np.abs(centavos) % 100).astype(str), 2)
+    sinal = np.where(centavos < 0, "-", "")
+    milhar = pd.Series(np.abs(centavos) // 100).map("{:,}".format).str.replace(",", ".").to_numpy(dtype=str)
+    estilo = rng.integers(0, 4, k)
+    brasileiro = np.char.add(np.char.add(np.char.add(sinal, milhar), ","), resto)
+    texto = np.select(
+        [estilo == 0, estilo == 1, estilo == 2],
+        [
+            brasileiro,
+            np.char.add("R$ ", brasileiro),
+            np.char.add(np.char.add("(", np.char.add(np.char.add(milhar, ","), resto)), ")"),
+        ],
+        np.char.add(np.char.add(np.char.add(sinal, reais), ","), resto),
+    )
+    texto[rng.random(k) < 0.01] = "abc"
+    valores = pd.Series(texto[rng.integers(0, k, n)], dtype=object)
+    dias = pd.Series(np.datetime64("2020-01-01") + rng.integers(0, 2000, n))
+    datas_txt = dias.dt.strftime("%d/%m/%Y").where(rng.random(n) < 0.8, dias.dt.strftime("%Y-%m-%d"))
+    return valores, datas_txt
+
+
+def _cronometra(fn, *args):
+    t0 = time.perf_counter()
+    out = fn(*args)
+    return out, time.perf_counter() - t0
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--tamanhos", type=int, nargs="+", default=[10000, 100000, 1000000])
+    ap.add_argument("--distintos", type=float, nargs="+", default=[1.0, 0.05])
+    args = ap.parse_args()
+    warnings.filterwarnings("ignore", message="Parsing dates")  # aviso do to_datetime antigo com datas ISO
+
+    print(f"{'linhas':>9} {'distintos':>9} {'to_float (s)':>13} {'planilha (s)':>13} {'centavos (s)':>13} {'ganho':>7} "
+          f"{'datas antigo (s)':>17} {'datas (s)':>10} {'ganho':>7} {'iguais':>7} {'to_float ≠':>11}")
+    for n in args.tamanhos:
+        for distintos in args.distintos:
+            valores, datas_txt = gera_dados(n, distintos)
+            antigo_float, t_float = _cronometra(lambda s: s.apply(to_float), valores)
+            antigo_planilha, t_planilha = _cronometra(lambda s: s.apply(_parse_valor_planilha), valores)
+            (centavos, motivo_valor), t_centavos = _cronometra(valores_centavos, valores)
+            antigo_datas, t_datas_antigo = _cronometra(
+                lambda s: pd.to_datetime(s, errors="coerce", dayfirst=True), datas_txt)
+            (novas_datas, _), t_datas = _cronometra(datas, datas_txt)
+
+            reais = centavos.astype("float64") / 100
+            aceitos = motivo_valor.isna()
+            ambos = aceitos & antigo_planilha.notna()
+            comparaveis = antigo_datas.notna() & datas_txt.str.contains("/", regex=False)
+            iguais = (
+                np.allclose(reais[ambos], antigo_planilha[ambos].astype("float64"))
+                and (novas_datas[comparaveis] == antigo_datas[comparaveis]).all()
+            )
+            divergentes = int((~np.isclose(reais[aceitos], antigo_float[aceitos])).sum())
+            print(f"{n:>9} {distintos:>9.0%} {t_float:>13.3f} {t_planilha:>13.3f} {t_centavos:>13.3f} "
+                  f"{min(t_float, t_planilha) / t_centavos:>6.1f}x {t_datas_antigo:>17.3f} {t_datas:>10.3f} "
+                  f"{t_datas_antigo / t_datas:>6.1f}x {str(iguais):>7} {divergentes:>11}")
+
+
+if __name__ == "__main__":
+    main()
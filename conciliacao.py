@@ -0,0 +1,333 @@
+"""Motor de conciliação extrato × contas.
+
+Sem dependência de Streamlit/Supabase para poder ser usado pelo app e pelo
+benchmark (`bench_conciliacao.py`).
+"""
+import numpy as np
+import pandas as pd
+from scipy.sparse import csr_matrix
+from scipy.optimize import linear_sum_assignment, linprog
+
+# Tolerância de valor usada na conciliação (1 centavo)
+TOLERANCIA_VALOR = 0.01
+
+# Colunas devolvidas pelo motor, na ordem exibida na página
+COLUNAS_MATCH = [
+    "extrato_id", "extrato_data", "extrato_hist", "extrato_valor",
+    "conta_id", "conta_empresa", "conta_fornecedor", "conta_desc",
+    "conta_venc", "conta_valor", "diff_valor", "diff_data",
+]
+
+
+def _dias(serie):
+    """Converte datas em número inteiro de dias desde a época (NaT -> -1 e máscara)."""
+    dt = pd.to_datetime(serie, errors="coerce")
+    valido = dt.notna().to_numpy()
+    dias = dt.to_numpy(dtype="datetime64[ns]").astype("datetime64[D]").astype(np.int64)
+    dias[~valido] = -1
+    return dias, valido
+
+
+def _centavos(valores):
+    return np.round(np.asarray(valores, dtype=np.float64) * 100).astype(np.int64)
+
+
+def _datas(serie):
+    """Datas para exibição: colunas datetime64 viram `date`; as demais passam como estão."""
+    if pd.api.types.is_datetime64_any_dtype(serie):
+        return serie.dt.date.to_numpy(dtype=object)
+    return serie.to_numpy(dtype=object)
+
+
+def _coluna(df, col, default):
+    if col in df.columns:
+        return df[col].to_numpy(dtype=object)
+    return np.full(len(df), default, dtype=object)
+
+
+def _pares_candidatos(extrato, candidatos, tolerancia_data):
+    """Gera os pares (movimento, conta) dentro de ±2 centavos e ±tolerancia_data dias.
+
+    As contas são ordenadas por (valor em centavos, vencimento) e cada
+    movimento encontra sua faixa por `searchsorted`, sem laço em Python.
+    Retorna (pos_extrato, pos_conta, diff_valor, diff_data) já filtrados pelos
+    mesmos critérios do laço original.
+    """
+    vazio = (np.empty(0, np.int64),) * 2 + (np.empty(0), np.empty(0, np.int64))
+
+    valores_ext = pd.to_numeric(extrato["valor"], errors="coerce").to_numpy(dtype=np.float64)
+    dias_ext, data_ok = _dias(extrato["data"])
+    saida = data_ok & (valores_ext < 0)
+    pos_ext = np.flatnonzero(saida)
+    if not len(pos_ext) or candidatos.empty:
+        return vazio
+    alvo = np.abs(valores_ext[pos_ext])
+    dias_alvo = dias_ext[pos_ext]
+
+    valores_c = pd.to_numeric(candidatos["valor_previsto"], errors="coerce").to_numpy(dtype=np.float64)
+    dias_c, venc_ok = _dias(candidatos["vencimento"])
+    # Contas sem vencimento ou valor nunca casam (diff_data = 9999 no laço original)
+    pos_c = np.flatnonzero(venc_ok & ~np.isnan(valores_c))
+    if not len(pos_c):
+        return vazio
+    cents_c = _centavos(valores_c[pos_c])
+
+    base = min(dias_c[pos_c].min(), dias_alvo.min()) - tolerancia_data - 1
+    largura = max(dias_c[pos_c].max(), dias_alvo.max()) - base + tolerancia_data + 2
+    valores_unicos, rank_c = np.unique(cents_c, return_inverse=True)
+    chave_c = rank_c.astype(np.int64) * largura + (dias_c[pos_c] - base)
+    ordem = np.argsort(chave_c, kind="stable")
+    chave_ord = chave_c[ordem]
+
+    cents_alvo = _centavos(alvo)
+    blocos_e, blocos_c = [], []
+    # ±2 centavos cobre qualquer par com |diff| <= 0,01 após arredondamento
+    for delta in range(-2, 3):
+        t = cents_alvo + delta
+        rank = np.searchsorted(valores_unicos, t)
+        presente = rank < len(valores_unicos)
+        presente[presente] = valores_unicos[rank[presente]] == t[presente]
+        if not presente.any():
+            continue
+        idx = np.flatnonzero(presente)
+        r = rank[idx].astype(np.int64)
+        lo = np.searchsorted(chave_ord, r * largura + (dias_alvo[idx] - tolerancia_data - base), side="left")
+        hi = np.searchsorted(chave_ord, r * largura + (dias_alvo[idx] + tolerancia_data - base), side="right")
+        n = hi - lo
+        if not n.sum():
+            continue
+        rep = np.repeat(idx, n)
+        desloc = np.arange(n.sum()) - np.repeat(np.cumsum(n) - n, n)
+        blocos_e.append(rep)
+        blocos_c.append(ordem[np.repeat(lo, n) + desloc])
+    if not blocos_e:
+        return vazio
+
+    i_alvo = np.concatenate(blocos_e)
+    i_cand = pos_c[np.concatenate(blocos_c)]
+    diff_valor = np.abs(valores_c[i_cand] - alvo[i_alvo])
+    diff_data = np.abs(dias_c[i_cand] - dias_alvo[i_alvo])
+    ok = (diff_valor <= TOLERANCIA_VALOR) & (diff_data <= tolerancia_data)
+    return pos_ext[i_alvo[ok]], i_cand[ok], diff_valor[ok], diff_data[ok]
+
+
+def _monta_matches(extrato, candidatos, pos_e, pos_c, diff_valor, diff_data):
+    """Monta o DataFrame de matches no formato exibido pela página."""
+    if not len(pos_e):
+        return pd.DataFrame(columns=COLUNAS_MATCH)
+    venc = pd.to_datetime(candidatos["vencimento"], errors="coerce").dt.date.to_numpy(dtype=object)
+    return pd.DataFrame({
+        "extrato_id": extrato["id"].to_numpy(dtype=object)[pos_e],
+        "extrato_data": _datas(extrato["data"])[pos_e],
+        "extrato_hist": _coluna(extrato, "historico", "")[pos_e],
+        "extrato_valor": pd.to_numeric(extrato["valor"], errors="coerce").to_numpy(dtype=np.float64)[pos_e],
+        "conta_id": candidatos["id"].to_numpy(dtype=object)[pos_c],
+        "conta_empresa": _coluna(candidatos, "empresa", "N/A")[pos_c],
+        "conta_fornecedor": _coluna(candidatos, "fornecedor_nome", "N/A")[pos_c],
+        "conta_desc": _coluna(candidatos, "descricao", "")[pos_c],
+        "conta_venc": venc[pos_c],
+        "conta_valor": pd.to_numeric(candidatos["valor_previsto"], errors="coerce").to_numpy(dtype=np.float64)[pos_c],
+        "diff_valor": diff_valor,
+        "diff_data": diff_data,
+    })
+
+
+def conciliar(extrato, candidatos, janela):
+    """Escolhe, para cada saída do extrato, a melhor conta candidata.
+
+    Critérios idênticos ao laço original: |valor| a até R$ 0,01 e vencimento a
+    até `janela + 2` dias; entre os válidos vence o menor `diff_data`, depois o
+    menor `diff_valor` e, no empate, a conta que aparece primeiro em
+    `candidatos`. Cada movimento é avaliado de forma independente.
+
+    `extrato` precisa de `id`, `data`, `valor` (negativo = saída);
+    `candidatos` precisa de `id`, `vencimento`, `valor_previsto`.
+    """
+    tolerancia_data = janela + 2
+    pos_e, pos_c, diff_valor, diff_data = _pares_candidatos(extrato, candidatos, tolerancia_data)
+    if len(pos_e):
+        # Ordem: movimento, diff_data, diff_valor, posição original da conta
+        ordem = np.lexsort((pos_c, diff_valor, diff_data, pos_e))
+        pos_e, pos_c, diff_valor, diff_data = pos_e[ordem], pos_c[ordem], diff_valor[ordem], diff_data[ordem]
+        primeiro = np.r_[True, pos_e[1:] != pos_e[:-1]]
+        pos_e, pos_c, diff_valor, diff_data = pos_e[primeiro], pos_c[primeiro], diff_valor[primeiro], diff_data[primeiro]
+    return _monta_matches(extrato, candidatos, pos_e, pos_c, diff_valor, diff_data)
+
+
+MOTIVO_INVALIDO = "data ou valor inválido no extrato"
+MOTIVO_SEM_CANDIDATO = "nenhuma conta com valor (±R$ 0,01) e vencimento na janela"
+MOTIVO_CONCORRENCIA = "contas compatíveis já atribuídas a outros movimentos"
+
+# Acima deste número de células a componente vai para o problema de transporte (esparso)
+LIMITE_DENSO = 250_000
+
+
+def _classes(valores, dias):
+    """Agrupa linhas de mesmo (valor, dia): são intercambiáveis na atribuição.
+
+    Retorna (valor, dia, tamanho) de cada classe, a classe de cada linha e as
+    linhas ordenadas por classe (ordem original dentro da classe).
+    """
+    chaves, classe, tamanho = np.unique(np.c_[valores, dias], axis=0, return_inverse=True, return_counts=True)
+    classe = classe.ravel()
+    return chaves[:, 0], chaves[:, 1].astype(np.int64), tamanho, classe, np.argsort(classe, kind="stable")
+
+
+def _componentes(cls_e, cls_c):
+    """Rótulo de componente conexa (union-find) para cada par de classes."""
+    pai = {}
+
+    def raiz(x):
+        while pai.setdefault(x, x) != x:
+            pai[x] = pai[pai[x]]
+            x = pai[x]
+        return x
+
+    # Classes de movimentos são nós >= 0; de contas, nós negativos
+    for e, c in zip(cls_e.tolist(), cls_c.tolist()):
+        ra, rb = raiz(e), raiz(-c - 1)
+        if ra != rb:
+            pai[ra] = rb
+    return np.array([raiz(e) for e in cls_e.tolist()], dtype=np.int64)
+
+
+def _atribui_particao(cls_e, cls_c, custo):
+    """Componente sem linhas repetidas: atribuição densa (`linear_sum_assignment`).
+
+    Retorna 1 nos pares escolhidos e 0 nos demais.
+    """
+    linhas, li = np.unique(cls_e, return_inverse=True)
+    colunas, ci = np.unique(cls_c, return_inverse=True)
+    # Recompensa grande por par garante cardinalidade máxima antes do custo
+    grande = (min(len(linhas), len(colunas)) + 1) * (int(custo.max()) + 1)
+    matriz = np.zeros((len(linhas), len(colunas)))
+    matriz[li, ci] = custo - grande
+    escolhido = np.zeros(matriz.shape, dtype=bool)
+    escolhido[linear_sum_assignment(matriz)] = True
+    return escolhido[li, ci].astype(np.int64)
+
+
+def _fluxo(cls_e, cls_c, custo, cap_e, cap_c):
+    """Quantos pares usar de cada par de classes: máximo de pares, depois menor custo.
+
+    É um problema de transporte; duas passadas de programação linear (HiGHS,
+    simplex dual) devolvem vértices inteiros — a matriz é de fluxo em rede.
+    """
+    k = len(cls_e)
+    usadas_e, ie = np.unique(cls_e, return_inverse=True)
+    usadas_c, ic = np.unique(cls_c, return_inverse=True)
+    a_ub = csr_matrix(
+        (np.ones(2 * k), (np.r_[ie, len(usadas_e) + ic], np.r_[np.arange(k), np.arange(k)])),
+        shape=(len(usadas_e) + len(usadas_c), k),
+    )
+    b_ub = np.r_[cap_e[usadas_e], cap_c[usadas_c]]
+    limites = np.c_[np.zeros(k), np.minimum(cap_e[cls_e], cap_c[cls_c])]
+    maximo = linprog(-np.ones(k), A_ub=a_ub, b_ub=b_ub, bounds=limites, method="highs-ds")
+    total = np.rint(-maximo.fun)
+    menor = linprog(custo, A_ub=a_ub, b_ub=b_ub, A_eq=np.ones((1, k)), b_eq=[total],
+                    bounds=limites, method="highs-ds")
+    return np.rint(menor.x).astype(np.int64)
+
+
+def _distribui(cls, fluxo, tamanho, linhas):
+    """Linhas concretas para cada par de classes, na ordem dos pares (fluxo[k] por par)."""
+    ordem = np.argsort(cls, kind="stable")
+    acumulado = np.cumsum(fluxo[ordem])
+    inicio_grupo = np.r_[0, np.cumsum(tamanho)][cls[ordem]]
+    # Deslocamento de cada par dentro da sua classe: soma dos fluxos anteriores da classe
+    primeiro = np.r_[True, cls[ordem][1:] != cls[ordem][:-1]]
+    base = np.maximum.accumulate(np.where(primeiro, acumulado - fluxo[ordem], 0))
+    inicio = np.empty(len(cls), dtype=np.int64)
+    inicio[ordem] = inicio_grupo + acumulado - fluxo[ordem] - base
+    n = fluxo.sum()
+    desloc = np.arange(n) - np.repeat(np.cumsum(fluxo) - fluxo, fluxo)
+    return linhas[np.repeat(inicio, fluxo) + desloc]
+
+
+def conciliar_um_para_um(extrato, candidatos, janela):
+    """Conciliação global: cada conta é usada por no máximo um movimento.
+
+    Resolve uma atribuição ótima que maximiza o número de pares e, entre as
+    de mesmo tamanho, minimiza a soma de `diff_data` (e depois `diff_valor`).
+    Movimentos (e contas) de mesmo valor e mesma data são intercambiáveis, então
+    o problema é resolvido sobre essas classes — o tamanho depende dos pares
+    (valor, data) distintos, não do número de linhas repetidas. Pares de
+    classes isolados são resolvidos direto; as demais componentes conexas, por
+    atribuição densa quando pequenas e sem repetições, e as restantes num único
+    problema de transporte esparso.
+
+    Retorna (matches, nao_conciliados); `nao_conciliados` traz as saídas do
+    extrato sem par e o `motivo`.
+    """
+    tolerancia_data = janela + 2
+    valores = pd.to_numeric(extrato["valor"], errors="coerce").to_numpy(dtype=np.float64)
+    dias_e, data_ok = _dias(extrato["data"])
+    valores_c = pd.to_numeric(candidatos["valor_previsto"], errors="coerce").to_numpy(dtype=np.float64)
+    dias_c, venc_ok = _dias(candidatos["vencimento"])
+    validas_e = np.flatnonzero(data_ok & (valores < 0))
+    validas_c = np.flatnonzero(venc_ok & ~np.isnan(valores_c))
+    # Chave pelo valor exato (não pelos centavos) para os pares saírem idênticos aos por linha
+    valor_e, dia_e, tam_e, classe_e, linhas_e = _classes(valores[validas_e], dias_e[validas_e])
+    valor_c, dia_c, tam_c, _, linhas_c = _classes(valores_c[validas_c], dias_c[validas_c])
+    linhas_e, linhas_c = validas_e[linhas_e], validas_c[linhas_c]
+
+    cls_e, cls_c, diff_valor, diff_data = _pares_candidatos(
+        pd.DataFrame({"valor": valor_e, "data": dia_e.astype("datetime64[D]")}),
+        pd.DataFrame({"valor_previsto": valor_c, "vencimento": dia_c.astype("datetime64[D]")}),
+        tolerancia_data,
+    )
+    # Custo inteiro: dias primeiro, centavos de diferença como desempate
+    custo = diff_data.astype(np.int64) * 10 + np.round(diff_valor * 100).astype(np.int64)
+    fluxo = np.minimum(tam_e[cls_e], tam_c[cls_c])
+    if len(cls_e):
+        grau_e = np.bincount(cls_e, minlength=len(tam_e))
+        grau_c = np.bincount(cls_c, minlength=len(tam_c))
+        disputado = np.flatnonzero((grau_e[cls_e] > 1) | (grau_c[cls_c] > 1))
+        if len(disputado):
+            rotulos = _componentes(cls_e[disputado], cls_c[disputado])
+            ordem = np.argsort(rotulos, kind="stable")
+            disputado, rotulos = disputado[ordem], rotulos[ordem]
+            cortes = np.flatnonzero(np.r_[True, rotulos[1:] != rotulos[:-1], True])
+            transporte = []
+            for a, b in zip(cortes[:-1], cortes[1:]):
+                grupo = disputado[a:b]
+                e, c = cls_e[grupo], cls_c[grupo]
+                repetida = (tam_e[e] > 1).any() or (tam_c[c] > 1).any()
+                if repetida or len(np.unique(e)) * len(np.unique(c)) > LIMITE_DENSO:
+                    transporte.append(grupo)
+                else:
+                    fluxo[grupo] = _atribui_particao(e, c, custo[grupo])
+            if transporte:
+                grupo = np.concatenate(transporte)
+                fluxo[grupo] = _fluxo(cls_e[grupo], cls_c[grupo], custo[grupo], tam_e, tam_c)
+
+    pos_e = _distribui(cls_e, fluxo, tam_e, linhas_e)
+    pos_c = _distribui(cls_c, fluxo, tam_c, linhas_c)
+    ordem = np.argsort(pos_e, kind="stable")
+    pos_e, pos_c = pos_e[ordem], pos_c[ordem]
+    matches = _monta_matches(
+        extrato, candidatos, pos_e, pos_c,
+        np.abs(valores_c[pos_c] + valores[pos_e]), np.abs(dias_c[pos_c] - dias_e[pos_e]),
+    )
+
+    # Candidatos por movimento: soma das contas das classes compatíveis
+    n_cand = np.zeros(len(extrato), np.int64)
+    n_cand[validas_e] = np.bincount(cls_e, weights=tam_c[cls_c], minlength=len(tam_e)).astype(np.int64)[classe_e]
+    saidas = np.flatnonzero(~(valores >= 0))  # inclui NaN
+    com_par = n_cand[saidas] > 0
+    pendentes = ~np.isin(saidas, pos_e)
+    n_cand = n_cand[saidas]
+    motivo = np.where(
+        np.isnan(valores[saidas]) | ~data_ok[saidas], MOTIVO_INVALIDO,
+        np.where(com_par, MOTIVO_CONCORRENCIA, MOTIVO_SEM_CANDIDATO),
+    )
+    p = saidas[pendentes]
+    nao_conciliados = pd.DataFrame({
+        "extrato_id": extrato["id"].to_numpy(dtype=object)[p],
+        "extrato_data": _datas(extrato["data"])[p],
+        "extrato_hist": _coluna(extrato, "historico", "")[p],
+        "extrato_valor": valores[p],
+        "candidatos": n_cand[pendentes],
+        "motivo": motivo[pendentes],
+    })
+    return matches, nao_conciliados
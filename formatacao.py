@@ -0,0 +1,95 @@
+"""Tipos das tabelas e formatação para exibição (reais, datas, rótulos), sem dependência do Streamlit."""
+import pandas as pd
+
+
+def money(x):
+    """Formata valor em reais (R$ 1.234,56). Vazio/inválido vira "—" (sempre devolve texto)."""
+    try:
+        v = float(x)
+    except (TypeError, ValueError):
+        return "—"
+    if pd.isna(v):
+        return "—"
+    return f"R$ {v:,.2f}".replace(",", "X").replace(".", ",").replace("X", ".")
+
+
+def centavos(valores):
+    """Converte uma série de valores em reais para centavos inteiros (Int64; inválidos viram <NA>)."""
+    return pd.to_numeric(valores, errors="coerce").mul(100).round().astype("Int64")
+
+
+def money_serie(valores):
+    """Versão vetorizada de `money` para uma série inteira."""
+    v = pd.to_numeric(pd.Series(valores), errors="coerce")
+    # Série vazia ou só com NaN sai do map com dtype float e sem acessor .str: força texto
+    txt = v.map("{:,.2f}".format, na_action="ignore").astype("string").str.translate(str.maketrans(",.", ".,"))
+    return ("R$ " + txt).fillna("—").astype(object)
+
+
+# Tipos por tabela aplicados na carga (uma conversão por leitura, guardada já tipada no cache).
+# Carimbos criado_em/atualizado_em seguem como texto: são comparados por igualdade com o banco.
+TIPOS_TABELAS = {
+    "contas": {
+        "datas": ["vencimento", "competencia"],
+        "valores": ["valor_previsto"],
+        "ids": ["id", "fornecedor_id", "categoria_id"],
+        "categorias": ["status", "empresa", "uf"],
+    },
+    "pagamentos": {
+        "datas": ["data_pagamento"],
+        "valores": ["valor_pago"],
+        "ids": ["id", "conta_id"],
+        "categorias": ["forma_pagamento"],
+    },
+    "aprovacoes": {"datas": ["data_aprovacao"], "ids": ["id", "conta_id"]},
+    "extrato": {"datas": ["data"], "valores": ["valor"], "ids": ["id"]},
+    "fornecedores": {"ids": ["id"]},
+    "categorias": {"ids": ["id"]},
+}
+
+
+def normaliza_tipos(df, table):
+    """Converte as colunas de `table` para tipos compactos: datetime64, float64, Int64 e category."""
+    tipos = TIPOS_TABELAS.get(table)
+    if not tipos or df.empty:
+        return df
+    for col in tipos.get("datas", []):
+        if col in df.columns:
+            df[col] = pd.to_datetime(df[col], errors="coerce", format="ISO8601")
+    for col in tipos.get("valores", []):
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors="coerce").astype("float64")
+    for col in tipos.get("ids", []):
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors="coerce").astype("Int64")
+    for col in tipos.get("categorias", []):
+        if col in df.columns:
+            df[col] = df[col].astype("category")
+    return df
+
+
+def datas_texto(serie):
+    """Datas de uma coluna tipada como texto AAAA-MM-DD (vazio para NaT)."""
+    return serie.dt.strftime("%Y-%m-%d").fillna("")
+
+
+def rotulos_contas(df, partes, sep=" | "):
+    """Monta {id: rótulo} com operações de string vetorizadas.
+
+    `partes` é uma lista de (prefixo, coluna, padrão); "valor_previsto" sai formatado em reais.
+    """
+    ids = df["id"].astype("int64")
+    textos = []
+    for prefixo, coluna, padrao in partes:
+        if coluna not in df.columns:
+            serie = pd.Series(padrao, index=df.index)
+        elif coluna == "valor_previsto":
+            serie = money_serie(df[coluna])
+        elif pd.api.types.is_datetime64_any_dtype(df[coluna]):
+            serie = datas_texto(df[coluna]).replace("", padrao)
+        else:
+            # Colunas category (status, empresa) não aceitam concatenação nem categorias novas no fillna
+            serie = df[coluna].astype(object).map(str, na_action="ignore").fillna(padrao)
+        textos.append(prefixo + serie)
+    rotulos = "#" + ids.map(str) + " - " + textos[0].str.cat(textos[1:], sep=sep)
+    return dict(zip(ids.tolist(), rotulos.tolist()))
@@ -0,0 +1,352 @@
+"""Leitura e conversão de arquivos de importação (CSV e XLSX), sem dependência do Streamlit.
+
+A codificação e o delimitador são detectados numa amostra do início do
+arquivo; o arquivo é então lido uma única vez (ou em blocos, se for grande).
+Planilhas XLSX são lidas linha a linha (openpyxl em modo somente leitura).
+Valores em reais e datas são convertidos por coluna inteira, com o motivo de
+cada célula rejeitada.
+"""
+import codecs
+
+import numpy as np
+import pandas as pd
+
+AMOSTRA_BYTES = 64 * 1024
+DELIMITADORES = [";", ",", "\t"]  # Ponto e vírgula primeiro (formato brasileiro)
+CODIFICACOES = ["utf-8", "cp1252", "latin-1"]
+LIMITE_BLOCOS_BYTES = 20 * 1024 * 1024  # acima disso a leitura é feita em blocos
+LINHAS_POR_BLOCO = 10_000
+
+
+def tamanho_arquivo(arquivo):
+    """Tamanho em bytes de um arquivo aberto (UploadedFile ou objeto binário)."""
+    tamanho = getattr(arquivo, "size", None)
+    if tamanho is not None:
+        return tamanho
+    pos = arquivo.tell()
+    arquivo.seek(0, 2)
+    tamanho = arquivo.tell()
+    arquivo.seek(pos)
+    return tamanho
+
+
+def detecta_codificacao(amostra):
+    """Primeira codificação que decodifica a amostra (tolera caractere cortado no fim)."""
+    if amostra.startswith(codecs.BOM_UTF8):
+        return "utf-8-sig"
+    for encoding in CODIFICACOES:
+        try:
+            codecs.getincrementaldecoder(encoding)().decode(amostra, final=False)
+            return encoding
+        except UnicodeDecodeError:
+            continue
+    return "latin-1"
+
+
+def detecta_delimitador(texto):
+    """Delimitador mais consistente nas primeiras linhas (mesma contagem que o cabeçalho)."""
+    linhas = [l for l in texto.splitlines()[:50] if l.strip()]
+    if len(linhas) > 1:
+        linhas = linhas[:-1]  # a última pode estar cortada pela amostra
+    melhor, melhor_nota = DELIMITADORES[0], (0, 0)
+    for sep in DELIMITADORES:
+        contagens = [l.count(sep) for l in linhas]
+        if not contagens or contagens[0] == 0:
+            continue
+        consistencia = sum(c == contagens[0] for c in contagens) / len(contagens)
+        nota = (consistencia, contagens[0])
+        if nota > melhor_nota:
+            melhor, melhor_nota = sep, nota
+    return melhor
+
+
+def detecta_formato(arquivo):
+    """(codificação, delimitador) a partir dos primeiros KB do arquivo."""
+    arquivo.seek(0)
+    amostra = arquivo.read(AMOSTRA_BYTES)
+    arquivo.seek(0)
+    encoding = detecta_codificacao(amostra)
+    texto = codecs.getincrementaldecoder(encoding)(errors="replace").decode(amostra, final=False)
+    return encoding, detecta_delimitador(texto)
+
+
+def le_csv(arquivo, chunksize=None):
+    """Lê o CSV uma única vez com o formato detectado.
+
+    Com `chunksize`, devolve um iterador de DataFrames (bytes inválidos na
+    codificação detectada viram "�", já que não há como recomeçar no meio).
+    Retorna (dados, codificação, delimitador).
+    """
+    encoding, sep = detecta_formato(arquivo)
+    if chunksize:
+        return pd.read_csv(arquivo, encoding=encoding, sep=sep, header=0, chunksize=chunksize, encoding_errors="replace"), encoding, sep
+    try:
+        return pd.read_csv(arquivo, encoding=encoding, sep=sep, header=0), encoding, sep
+    except UnicodeDecodeError:
+        # Acento fora da amostra: relê como cp1252 (planilhas exportadas no Windows)
+        arquivo.seek(0)
+        return pd.read_csv(arquivo, encoding="cp1252", sep=sep, header=0, encoding_errors="replace"), "cp1252", sep
+
+
+def le_csv_blocos(arquivo):
+    """Iterador de DataFrames: um só bloco para arquivos pequenos, vários para os grandes.
+
+    Retorna (blocos, codificação, delimitador).
+    """
+    if tamanho_arquivo(arquivo) > LIMITE_BLOCOS_BYTES:
+        return le_csv(arquivo, chunksize=LINHAS_POR_BLOCO)
+    df, encoding, sep = le_csv(arquivo)
+    return iter([df]), encoding, sep
+
+
+def le_xlsx_blocos(arquivo, linhas_por_bloco=LINHAS_POR_BLOCO):
+    """Gera DataFrames de até `linhas_por_bloco` linhas da primeira aba, sem carregar a planilha toda."""
+    from openpyxl import load_workbook  # dependência opcional, a mesma de pandas.read_excel
+
+    wb = load_workbook(arquivo, read_only=True, data_only=True)
+    try:
+        linhas = wb.worksheets[0].iter_rows(values_only=True)
+        cabecalho = next(linhas, None)
+        if cabecalho is None:
+            return
+        colunas = [str(c).strip() if c is not None else f"Unnamed: {i}" for i, c in enumerate(cabecalho)]
+        n = len(colunas)
+        bloco = []
+        for linha in linhas:
+            if all(v is None for v in linha):
+                continue
+            bloco.append((tuple(linha) + (None,) * n)[:n])
+            if len(bloco) >= linhas_por_bloco:
+                yield pd.DataFrame(bloco, columns=colunas)
+                bloco = []
+        if bloco:
+            yield pd.DataFrame(bloco, columns=colunas)
+    finally:
+        wb.close()
+
+
+def le_planilha_blocos(arquivo, nome, linhas_por_bloco=LINHAS_POR_BLOCO):
+    """Blocos de uma planilha XLSX ou CSV, lidos sob demanda (memória limitada a um bloco).
+
+    Retorna (blocos, descrição do formato detectado).
+    """
+    if nome.lower().endswith(".xlsx"):
+        return le_xlsx_blocos(arquivo, linhas_por_bloco), "XLSX"
+    blocos, encoding, sep = le_csv(arquivo, chunksize=linhas_por_bloco)
+    return blocos, f"Codificação: {encoding}, Delimitador: {sep!r}"
+
+
+MOTIVO_VAZIO = "vazio"
+MOTIVO_VALOR_INVALIDO = "valor inválido"
+MOTIVO_DATA_INVALIDA = "data inválida"
+
+# Formatos de data tentados em ordem, cada um numa passada vetorizada; o resto vai com dayfirst
+FORMATOS_DATA = ["%Y-%m-%d", "%d/%m/%Y", "%d/%m/%y", "%d-%m-%Y", "%d.%m.%Y", "%Y-%m-%d %H:%M:%S"]
+
+
+# Valores em reais são lidos como matriz de caracteres (posição × texto distinto), com operações
+# do numpy por posição. Textos mais longos que isso são rejeitados sem entrar na matriz.
+LARGURA_MAXIMA_VALOR = 40
+MAXIMO_DIGITOS_VALOR = 15  # exato em float64 e em int64
+# Espaços removidos antes da conversão (os mesmos de str.isspace)
+ESPACOS = np.array([c for c in range(0x3001) if chr(c).isspace()], dtype=np.uint32)
+_ESCALA_DECIMAIS = np.array([100, 10, 1], dtype=np.int64)  # centavos por unidade com 0, 1 ou 2 decimais
+
+
+def _por_valor_distinto(serie, converte):
+    """Aplica `converte` só aos valores distintos da coluna e espalha o resultado.
+
+    Colunas de importação repetem muito (datas, valores recorrentes), e as
+    operações `.str` do pandas custam por elemento; `converte` recebe uma
+    Series (object) dos valores distintos e devolve (convertidos, vazio,
+    rejeitado) alinhados a ela.
+    """
+    codigos, unicos = pd.factorize(serie, use_na_sentinel=False)
+    convertidos, vazio, rejeitado = converte(pd.Series(unicos, dtype=object))
+    valores = pd.Series(convertidos.to_numpy()[codigos], index=serie.index)
+    vazio = pd.Series(np.asarray(vazio, dtype=bool)[codigos], index=serie.index)
+    rejeitado = pd.Series(np.asarray(rejeitado, dtype=bool)[codigos], index=serie.index)
+    return valores.mask(rejeitado), vazio, rejeitado
+
+
+def _motivos(rejeitado, vazio, motivo):
+    return pd.Series(np.where(vazio, MOTIVO_VAZIO, np.where(rejeitado, motivo, None)), index=rejeitado.index, dtype=object)
+
+
+def _centavos_exatos(numeros):
+    """Máscara dos números que são um valor inteiro de centavos (sem fração de centavo)."""
+    centavos = numeros * 100
+    return np.isfinite(numeros) & (np.abs(centavos - np.round(centavos)) < 1e-6)
+
+
+def _centavos_textos(textos):
+    """Centavos de um array de textos em reais, NaN nos inválidos; devolve (centavos, vazio).
+
+    Depois de tirar "R$" e espaços: sinal na frente ou no fim ("1.234,56-",
+    comum em extratos) ou o valor todo entre parênteses; milhar com ponto em
+    grupos de três dígitos e até dois decimais com vírgula, ou decimal com
+    ponto sem milhar ("1500.00"). Qualquer outra forma dá NaN, nunca é
+    arredondada. Sem laço por texto: cada passo é uma operação sobre a matriz
+    posição × texto (as reduções por texto correm sobre linhas contíguas).
+    """
+    n = len(textos)
+    chars = textos.astype("U")
+    longo = np.zeros(n, dtype=bool)
+    if chars.itemsize // 4 > LARGURA_MAXIMA_VALOR:
+        longo = np.fromiter(map(len, textos), dtype=np.int64, count=n) > LARGURA_MAXIMA_VALOR
+        chars = np.where(longo, "", textos).astype("U")
+    if chars.itemsize:
+        chars = np.ascontiguousarray(chars.view(np.uint32).reshape(n, -1).T)
+    else:
+        chars = np.zeros((1, n), dtype=np.uint32)
+    linhas = np.arange(n)
+
+    # Caracteres ignorados: espaços e "R$"; o resto é compactado no topo, em bytes
+    # (fora do ASCII nada é válido: vira 255)
+    espaco = chars == ord(" ")
+    raros = (chars > 127) | ((chars > 0) & (chars < 32))
+    if raros.any():
+        espaco[raros] = np.isin(chars[raros], ESPACOS)
+    reais = (chars[:-1] == ord("R")) & (chars[1:] == ord("$"))
+    ignorado = espaco.copy()
+    ignorado[:-1] |= reais
+    ignorado[1:] |= reais
+    util = (chars != 0) & ~ignorado
+    tamanho = np.count_nonzero(util, axis=0)
+    vazio = ~longo & ~((chars != 0) & ~espaco).any(axis=0)
+    largura = max(int(tamanho.max(initial=0)), 1)
+    pos = np.arange(largura, dtype=np.int8)[:, None]
+    c = np.zeros((largura, n), dtype=np.uint8)
+    c.T[(pos < tamanho).T] = np.minimum(chars.T[util.T], 255)
+    em = lambda p: c[np.clip(p, 0, largura - 1), linhas]
+
+    # Sinal: parênteses em volta de tudo, ou "-" na frente ou no fim (nunca os dois)
+    parenteses = (tamanho >= 2) & (c[0] == ord("(")) & (em(tamanho - 1) == ord(")"))
+    inicio, fim = parenteses.astype(np.int64), tamanho - parenteses
+    menos_frente = (fim > inicio) & (em(inicio) == ord("-"))
+    inicio = inicio + menos_frente
+    menos_fim = ~menos_frente & (fim > inicio) & (em(fim - 1) == ord("-"))
+    fim = fim - menos_fim
+    negativo = parenteses | menos_frente | menos_fim
+    valido = ~(parenteses & (menos_frente | menos_fim)) & (fim > inicio)
+
+    corpo = (pos >= inicio) & (pos < fim)
+    digito = corpo & (c >= ord("0")) & (c <= ord("9"))
+    ponto = corpo & (c == ord("."))
+    virgula = corpo & (c == ord(","))
+    valido &= ~(corpo & ~(digito | ponto | virgula)).any(axis=0)
+
+    # Decimais: depois da vírgula (sem ponto depois dela) ou, sem vírgula, depois do único ponto
+    n_virgulas = np.count_nonzero(virgula, axis=0)
+    # Posição da vírgula (ou do ponto) pela soma: só importa quando há uma só
+    pos_virgula = np.where(n_virgulas > 0, (virgula * pos).sum(axis=0, dtype=np.int64), fim)
+    valido &= (n_virgulas <= 1) & ~(ponto & (pos > pos_virgula)).any(axis=0)
+    n_pontos = np.count_nonzero(ponto, axis=0)
+    pos_ponto = (ponto * pos).sum(axis=0, dtype=np.int64)
+    ponto_decimal = (n_virgulas == 0) & (n_pontos == 1) & (fim - pos_ponto - 1 >= 1) & (fim - pos_ponto - 1 <= 2)
+    fim_inteiro = np.where(ponto_decimal, pos_ponto, pos_virgula)
+    n_decimais = fim - fim_inteiro - (fim_inteiro < fim)
+    valido &= (fim_inteiro == fim) | ((n_decimais >= 1) & (n_decimais <= 2))
+
+    # Parte inteira: começa por dígito; com milhar, ponto exatamente a cada três dígitos
+    inteiro = corpo & (pos < fim_inteiro)
+    valido &= em(inicio) >= ord("0")
+    ponto_inteiro = ponto & inteiro
+    milhar = inteiro & ((fim_inteiro.astype(np.int8) - pos) & 3 == 0)
+    valido &= ~ponto_inteiro.any(axis=0) | ~(ponto_inteiro != milhar).any(axis=0)
+
+    # Valor: dígitos da parte inteira e decimais concatenados, uma posição por vez
+    valido &= np.count_nonzero(digito, axis=0) <= MAXIMO_DIGITOS_VALOR
+    centavos = np.zeros(n, dtype=np.int64)
+    for j in range(largura):
+        centavos = np.where(digito[j], centavos * 10 + (c[j].astype(np.int64) - ord("0")), centavos)
+    centavos = np.where(valido, centavos, 0) * _ESCALA_DECIMAIS[np.clip(n_decimais, 0, 2)]
+    centavos = np.where(negativo, -centavos, centavos).astype("float64")
+    return np.where(valido & ~vazio, centavos, np.nan), vazio
+
+
+def _valores_texto(t):
+    """Converte os valores distintos de uma coluna de texto em reais."""
+    unicos = t.to_numpy(dtype=object)
+    tipo = pd.api.types.infer_dtype(unicos, skipna=False)
+    nulo = np.zeros(len(unicos), dtype=bool) if tipo == "string" else pd.isna(unicos)
+    if tipo != "string":
+        tipo = pd.api.types.infer_dtype(unicos, skipna=True)
+    # Planilhas misturam números e textos na mesma coluna: separa pelos tipos dos valores distintos
+    if tipo in ("string", "empty"):
+        texto, numero = ~nulo, np.zeros(len(unicos), dtype=bool)
+    elif tipo in ("integer", "floating", "mixed-integer-float", "decimal"):
+        texto, numero = np.zeros(len(unicos), dtype=bool), ~nulo
+    else:
+        texto = np.fromiter((isinstance(v, str) for v in unicos), dtype=bool, count=len(unicos))
+        numero = ~nulo & np.fromiter(
+            (isinstance(v, (int, float, np.number)) and not isinstance(v, (bool, np.bool_)) for v in unicos),
+            dtype=bool, count=len(unicos),
+        )
+    numeros = np.full(len(unicos), np.nan)
+    vazio = nulo.copy()
+    if texto.any():
+        centavos, vazio[texto] = _centavos_textos(unicos[texto])
+        numeros[texto] = centavos / 100
+    if numero.any():
+        numeros[numero] = pd.to_numeric(pd.Series(unicos[numero]), errors="coerce").astype("float64")
+    valido = (texto | numero) & _centavos_exatos(numeros)
+    return pd.Series(numeros, index=t.index), vazio, ~valido
+
+
+def valores_centavos(serie):
+    """Converte uma coluna de valores em reais para centavos (Int64), sem laço por célula.
+
+    Aceita números e textos como "R$ 1.234,56", "-1234,56", "1.234,56-",
+    "(1.234,56)", "1.234" e "1500.00": ponto seguido de três dígitos é
+    separador de milhar, de um ou dois é decimal (sem milhar), e vírgula tem
+    até dois decimais. Textos fora desse formato ("1,234", "0,001",
+    "1.23,45", "1,234.56") e números com fração de centavo são rejeitados,
+    nunca arredondados (ver `_centavos_textos`).
+
+    Retorna (centavos, motivo): `motivo` é None nas células aceitas e
+    MOTIVO_VAZIO / MOTIVO_VALOR_INVALIDO nas rejeitadas (centavos <NA>).
+    """
+    serie = pd.Series(serie)
+    if pd.api.types.is_numeric_dtype(serie) and not pd.api.types.is_bool_dtype(serie):
+        numeros = serie.astype("float64")
+        vazio = numeros.isna()
+        rejeitado = vazio | ~_centavos_exatos(numeros)
+    else:
+        numeros, vazio, rejeitado = _por_valor_distinto(serie, _valores_texto)
+        numeros = numeros.astype("float64")
+    centavos = (numeros * 100).round().where(~rejeitado).astype("Int64")
+    return centavos, _motivos(rejeitado, vazio, MOTIVO_VALOR_INVALIDO)
+
+
+def _datas_texto(t):
+    t = t.astype("string").str.strip()
+    vazio = (t.isna() | (t == "")).fillna(True).to_numpy(dtype=bool)
+    convertidas = pd.Series(pd.NaT, index=t.index, dtype="datetime64[ns]")
+    for formato in FORMATOS_DATA:
+        faltam = convertidas.isna() & ~vazio
+        if not faltam.any():
+            break
+        convertidas[faltam] = pd.to_datetime(t[faltam], format=formato, errors="coerce")
+    faltam = convertidas.isna() & ~vazio
+    if faltam.any():
+        convertidas[faltam] = pd.to_datetime(t[faltam], errors="coerce", dayfirst=True, format="mixed")
+    return convertidas, vazio, vazio | convertidas.isna().to_numpy()
+
+
+def datas(serie):
+    """Converte uma coluna de datas (dia primeiro) para datetime64, sem laço por célula.
+
+    Cada formato de FORMATOS_DATA é uma passada sobre os valores distintos
+    ainda não convertidos; o que sobrar passa por `pd.to_datetime(dayfirst=True)`.
+    Retorna (datas, motivo) no mesmo formato de `valores_centavos`.
+    """
+    serie = pd.Series(serie)
+    if pd.api.types.is_datetime64_any_dtype(serie):
+        convertidas = serie
+        vazio = serie.isna()
+        rejeitado = vazio
+    else:
+        convertidas, vazio, rejeitado = _por_valor_distinto(serie, _datas_texto)
+        convertidas = convertidas.astype("datetime64[ns]")
+    return convertidas, _motivos(rejeitado, vazio, MOTIVO_DATA_INVALIDA)
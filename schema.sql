@@ -4,6 +4,159 @@ create table if not exists public.categorias (id bigserial primary key, nome tex
 create table if not exists public.contas (id bigserial primary key, fornecedor_id bigint references public.fornecedores(id) on delete set null, categoria_id bigint references public.categorias(id) on delete set null, descricao text, competencia date, vencimento date not null, valor_previsto numeric(14,2) not null, status text not null default 'provisionado' check (status in ('provisionado','aprovado','pago','cancelado')), empresa text, numero_documento text, criado_em timestamptz default now());
 create index if not exists contas_vencimento_idx on public.contas (vencimento);
 create index if not exists contas_status_idx on public.contas (status);
+create index if not exists contas_criado_em_id_idx on public.contas (criado_em desc, id desc);
+create index if not exists contas_valor_previsto_idx on public.contas (valor_previsto);
 create table if not exists public.aprovacoes (id bigserial primary key, conta_id bigint not null references public.contas(id) on delete cascade, aprovado_por text not null, data_aprovacao date not null, observacao text, criado_em timestamptz default now());
 create table if not exists public.pagamentos (id bigserial primary key, conta_id bigint not null references public.contas(id) on delete cascade, data_pagamento date not null, valor_pago numeric(14,2) not null, forma_pagamento text, comprovante_url text, conciliado boolean default false, criado_em timestamptz default now());
 create table if not exists public.extrato (id bigserial primary key, data date not null, historico text, valor numeric(14,2) not null, origem text default 'upload_csv', criado_em timestamptz default now());
+
+-- Aprovação em lote numa única transação: muda o status e registra as aprovações
+create or replace function public.aprovar_contas(p_ids bigint[], p_aprovado_por text, p_data_aprovacao date)
+returns setof bigint language sql as $$
+  with alvo as (
+    update public.contas set status = 'aprovado'
+    where id = any(p_ids) and status = 'provisionado'
+    returning id
+  ), ins as (
+    insert into public.aprovacoes (conta_id, aprovado_por, data_aprovacao)
+    select id, p_aprovado_por, p_data_aprovacao from alvo
+    returning conta_id
+  )
+  select conta_id from ins;
+$$;
+
+-- Versão da linha para concorrência otimista (atualizado_em muda a cada UPDATE)
+alter table public.contas add column if not exists atualizado_em timestamptz default now();
+create or replace function public.set_atualizado_em() returns trigger language plpgsql as $$
+begin
+  new.atualizado_em := now();
+  return new;
+end $$;
+drop trigger if exists contas_set_atualizado_em on public.contas;
+create trigger contas_set_atualizado_em before update on public.contas
+  for each row execute function public.set_atualizado_em();
+
+-- Pagamento em lote numa única transação: marca as contas em aberto como 'pago' e registra os pagamentos.
+-- Com atualizado_em, só paga se a conta não mudou desde a leitura; conta repetida no lote vale uma vez.
+create or replace function public.registrar_pagamentos(p_pagamentos jsonb)
+returns setof bigint language sql as $$
+  with dados as (
+    select distinct on (conta_id) *
+    from (
+      select (e->>'conta_id')::bigint as conta_id, (e->>'data_pagamento')::date as data_pagamento,
+             (e->>'valor_pago')::numeric as valor_pago, e->>'forma_pagamento' as forma_pagamento,
+             coalesce((e->>'conciliado')::boolean, false) as conciliado,
+             (e->>'atualizado_em')::timestamptz as atualizado_em, ordem
+      from jsonb_array_elements(p_pagamentos) with ordinality as x(e, ordem)
+    ) p
+    order by conta_id, ordem
+  ), alvo as (
+    update public.contas c set status = 'pago'
+    from dados d
+    where c.id = d.conta_id and c.status in ('aprovado','provisionado')
+      and (d.atualizado_em is null or c.atualizado_em = d.atualizado_em)
+    returning c.id
+  ), ins as (
+    insert into public.pagamentos (conta_id, data_pagamento, valor_pago, forma_pagamento, conciliado)
+    select d.conta_id, d.data_pagamento, d.valor_pago, d.forma_pagamento, d.conciliado
+    from dados d join alvo a on a.id = d.conta_id
+    returning conta_id
+  )
+  select conta_id from ins;
+$$;
+
+-- Sincronização incremental: atualizado_em também em pagamentos/aprovações e registro de exclusões
+alter table public.pagamentos add column if not exists atualizado_em timestamptz default now();
+alter table public.aprovacoes add column if not exists atualizado_em timestamptz default now();
+drop trigger if exists pagamentos_set_atualizado_em on public.pagamentos;
+create trigger pagamentos_set_atualizado_em before update on public.pagamentos
+  for each row execute function public.set_atualizado_em();
+drop trigger if exists aprovacoes_set_atualizado_em on public.aprovacoes;
+create trigger aprovacoes_set_atualizado_em before update on public.aprovacoes
+  for each row execute function public.set_atualizado_em();
+create index if not exists contas_atualizado_em_idx on public.contas (atualizado_em);
+create index if not exists pagamentos_atualizado_em_idx on public.pagamentos (atualizado_em);
+create index if not exists aprovacoes_atualizado_em_idx on public.aprovacoes (atualizado_em);
+create table if not exists public.exclusoes (id bigserial primary key, tabela text not null, registro_id bigint not null, excluido_em timestamptz not null default clock_timestamp());
+create index if not exists exclusoes_tabela_excluido_em_idx on public.exclusoes (tabela, excluido_em);
+create or replace function public.registra_exclusao() returns trigger language plpgsql as $$
+begin
+  insert into public.exclusoes (tabela, registro_id) values (tg_table_name, old.id);
+  return old;
+end $$;
+drop trigger if exists contas_registra_exclusao on public.contas;
+create trigger contas_registra_exclusao after delete on public.contas
+  for each row execute function public.registra_exclusao();
+drop trigger if exists pagamentos_registra_exclusao on public.pagamentos;
+create trigger pagamentos_registra_exclusao after delete on public.pagamentos
+  for each row execute function public.registra_exclusao();
+drop trigger if exists aprovacoes_registra_exclusao on public.aprovacoes;
+create trigger aprovacoes_registra_exclusao after delete on public.aprovacoes
+  for each row execute function public.registra_exclusao();
+
+-- Importação idempotente do extrato: assinatura = md5(data|histórico|centavos|ordem entre linhas idênticas do dia)
+alter table public.extrato add column if not exists assinatura text;
+update public.extrato e set assinatura = x.assinatura
+from (
+  select id, md5(
+    data::text || '|' || btrim(coalesce(historico, '')) || '|' || (valor * 100)::bigint || '|' ||
+    (row_number() over (partition by data, btrim(coalesce(historico, '')), valor order by id) - 1)
+  ) as assinatura
+  from public.extrato
+) x
+where e.id = x.id and e.assinatura is null;
+create unique index if not exists extrato_assinatura_key on public.extrato (assinatura);
+
+-- Importações em segundo plano: estado e checkpoint de cada arquivo (permite retomar após interrupção)
+create table if not exists public.importacoes (
+  id bigserial primary key,
+  tipo text not null check (tipo in ('contas','extrato')),
+  arquivo text,
+  impressao text not null,
+  usuario text,
+  status text not null default 'executando' check (status in ('executando','concluida','concluida_com_falhas','interrompida','falhou')),
+  parametros jsonb not null default '{}'::jsonb,
+  checkpoint jsonb,
+  total integer,
+  feitas integer not null default 0,
+  inseridas integer not null default 0,
+  ignoradas integer not null default 0,
+  rejeitadas integer not null default 0,
+  falhas integer not null default 0,
+  segundos numeric(12,3) not null default 0,
+  detalhes jsonb not null default '{}'::jsonb,
+  erro text,
+  criado_em timestamptz default now(),
+  atualizado_em timestamptz default now()
+);
+create index if not exists importacoes_tipo_impressao_idx on public.importacoes (tipo, impressao, id desc);
+drop trigger if exists importacoes_set_atualizado_em on public.importacoes;
+create trigger importacoes_set_atualizado_em before update on public.importacoes
+  for each row execute function public.set_atualizado_em();
+
+-- Execução abandonada: "executando" sem batimento há p_abandono_segundos (relógio do banco).
+-- O update é condicional, então só quem o fizer vê true.
+create or replace function public.marca_importacao_abandonada(p_id bigint, p_abandono_segundos integer)
+returns boolean language sql as $$
+  with alvo as (
+    update public.importacoes set status = 'interrompida'
+    where id = p_id and status = 'executando'
+      and atualizado_em < now() - make_interval(secs => p_abandono_segundos)
+    returning id
+  )
+  select exists (select 1 from alvo);
+$$;
+
+-- Bancos criados antes de 'concluida_com_falhas': recria a restrição de status
+alter table public.importacoes drop constraint if exists importacoes_status_check;
+alter table public.importacoes add constraint importacoes_status_check
+  check (status in ('executando','concluida','concluida_com_falhas','interrompida','falhou'));
+
+-- Empresas distintas já usadas em contas (filtro da grade de lançamento), sem trazer a tabela
+create index if not exists contas_empresa_idx on public.contas (empresa);
+create or replace function public.empresas_contas()
+returns setof text language sql stable as $$
+  select distinct empresa from public.contas
+  where empresa is not null and btrim(empresa) <> ''
+  order by 1;
+$$;
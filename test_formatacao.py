@@ -0,0 +1,42 @@
+import numpy as np
+import pandas as pd
+
+from formatacao import centavos, money, money_serie, normaliza_tipos, rotulos_contas
+
+
+def test_money_serie_formata_como_money():
+    valores = pd.Series([1234.5, -0.01, np.nan, 1000000])
+    assert money_serie(valores).tolist() == [money(v) for v in valores]
+    assert money_serie(valores).tolist()[0] == "R$ 1.234,50"
+
+
+def test_money_serie_vazia():
+    assert money_serie(pd.Series([], dtype="float64")).tolist() == []
+    assert money_serie(pd.Series([], dtype=object)).tolist() == []
+
+
+def test_money_serie_so_nan():
+    assert money_serie(pd.Series([np.nan, None])).tolist() == ["—", "—"]
+    assert money_serie(pd.Series(["abc", None], dtype=object)).tolist() == ["—", "—"]
+
+
+def test_centavos():
+    assert centavos(pd.Series([1.25, 2, "x"])).tolist() == [125, 200, pd.NA]
+
+
+def test_rotulos_contas_com_colunas_category():
+    contas = normaliza_tipos(pd.DataFrame({
+        "id": [1, 2],
+        "descricao": ["Aluguel", "Energia"],
+        "empresa": ["Matriz", None],
+        "status": ["Pendente", "Aprovado"],
+        "vencimento": ["2024-05-10", None],
+        "valor_previsto": [1500.0, 89.9],
+    }), "contas")
+    assert contas["empresa"].dtype == "category"
+    partes = [("", "descricao", ""), ("", "empresa", "N/A"), ("Status: ", "status", "-"),
+              ("Venc.: ", "vencimento", "-"), ("", "valor_previsto", "")]
+    assert rotulos_contas(contas, partes) == {
+        1: "#1 - Aluguel | Matriz | Status: Pendente | Venc.: 2024-05-10 | R$ 1.500,00",
+        2: "#2 - Energia | N/A | Status: Aprovado | Venc.: - | R$ 89,90",
+    }
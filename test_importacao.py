@@ -0,0 +1,56 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from importacao import MOTIVO_VALOR_INVALIDO, MOTIVO_VAZIO, valores_centavos
+
+
+def _converte(valor):
+    centavos, motivo = valores_centavos(pd.Series([valor], dtype=object))
+    return (None if pd.isna(centavos.iloc[0]) else int(centavos.iloc[0])), motivo.iloc[0]
+
+
+@pytest.mark.parametrize("texto, esperado", [
+    ("1.234", 123400),
+    ("R$ 1.234,56", 123456),
+    ("R$\xa01.234,56", 123456),
+    ("1.234.567,89", 123456789),
+    ("-1234,56", -123456),
+    ("1.234,56-", -123456),
+    ("(1.234,56)", -123456),
+    ("12,3", 1230),
+    ("0,01", 1),
+    ("500", 50000),
+    ("1500.00", 150000),
+    ("1234.5", 123450),
+    ("-1234.56", -123456),
+])
+def test_valores_aceitos(texto, esperado):
+    assert _converte(texto) == (esperado, None)
+
+
+@pytest.mark.parametrize("texto", ["1,234", "0,001", "1.23,45", "1,234.56", "1.234.56", "1234.567", "1.2345,6", "abc", "(5", "(-5)", "1,2,3"])
+def test_valores_invalidos_sao_rejeitados_sem_arredondar(texto):
+    assert _converte(texto) == (None, MOTIVO_VALOR_INVALIDO)
+
+
+@pytest.mark.parametrize("texto", ["", "   ", None, np.nan])
+def test_valores_vazios(texto):
+    assert _converte(texto) == (None, MOTIVO_VAZIO)
+
+
+def test_numeros_de_planilha():
+    centavos, motivo = valores_centavos(pd.Series([5, 1234.5, 0.001, None], dtype=object))
+    assert centavos.tolist()[:2] == [500, 123450]
+    assert motivo.tolist() == [None, None, MOTIVO_VALOR_INVALIDO, MOTIVO_VAZIO]
+
+
+def test_coluna_numerica():
+    centavos, motivo = valores_centavos(pd.Series([1.5, 0.001, np.nan]))
+    assert centavos.iloc[0] == 150
+    assert motivo.tolist() == [None, MOTIVO_VALOR_INVALIDO, MOTIVO_VAZIO]
+
+
+def test_coluna_vazia():
+    centavos, motivo = valores_centavos(pd.Series([], dtype=object))
+    assert centavos.empty and motivo.empty